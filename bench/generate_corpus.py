@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import random
+
+binary_operators = ['+', '-', '*', '/', '%', '&', '|', '<', '==', '&&']
+unary_operators = ['-', '!', '~']
+
+
+class CorpusGenerator:
+    # generates C++ sources of the given shape: each source file defines functions, some of them are templates,
+    # includes a few of the shared headers and calls their inline functions;
+    # functions consist of statements with expressions of the given depth until they have the given number of terminals
+    def __init__(self, depth, terminals, template_density, header_functions, seed):
+        self.depth = depth
+        self.terminals = terminals
+        self.template_density = template_density
+        self.header_functions = header_functions
+        self.random = random.Random(seed)
+
+    def header(self, header_id):
+        lines = ['#pragma once', '']
+        for function_id in range(self.header_functions):
+            name = 'header{0}_function{1}'.format(header_id, function_id)
+            lines.append(self.function(name, 'inline int', [], is_template=False))
+        lines.append('struct HeaderStruct{0} {{'.format(header_id))
+        lines.append('  int value_field;')
+        lines.append('  int get_value(int scale_factor) const {{ return value_field * scale_factor + {0}; }}'.format(
+            header_id))
+        lines.append('};')
+        return '\n'.join(lines) + '\n'
+
+    def source(self, file_id, functions_num, headers):
+        lines = ['#include "header{0}.h"'.format(header_id) for header_id in headers]
+        lines.append('')
+        callees = ['header{0}_function{1}'.format(header_id, function_id)
+                   for header_id in headers for function_id in range(self.header_functions)]
+        for function_id in range(functions_num):
+            name = 'file{0}_function{1}'.format(file_id, function_id)
+            is_template = self.random.random() < self.template_density
+            lines.append(self.function(name, 'int', callees, is_template))
+            if not is_template:
+                callees.append(name)
+        return '\n'.join(lines) + '\n'
+
+    def function(self, name, return_type, callees, is_template):
+        variables = ['first_value', 'second_value', 'loop_counter', 'total_sum']
+        if is_template:
+            header = 'template <typename ValueType>\nValueType {0}(ValueType first_value, ValueType second_value)'
+            declaration = '  ValueType loop_counter = first_value, total_sum = second_value;'
+        else:
+            header = return_type + ' {0}(int first_value, int second_value)'
+            declaration = '  int loop_counter = first_value, total_sum = second_value;'
+        lines = [header.format(name) + ' {', declaration]
+        terminals_num = 0
+        while terminals_num < self.terminals:
+            expression, expression_terminals = self.expression(self.depth, variables, callees)
+            terminals_num += expression_terminals + 1
+            target = self.random.choice(variables[2:])
+            if self.random.random() < 0.2:
+                lines.append('  if ({0}) {{ {1} += 1; }}'.format(expression, target))
+            else:
+                lines.append('  {0} = {1};'.format(target, expression))
+        lines.append('  return total_sum;')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def expression(self, depth, variables, callees):
+        # returns the expression and the number of its terminals
+        if depth <= 0:
+            if self.random.random() < 0.3:
+                return str(self.random.randint(0, 1000)), 1
+            return self.random.choice(variables), 1
+        choice = self.random.random()
+        if choice < 0.15:
+            operand, terminals_num = self.expression(depth - 1, variables, callees)
+            return self.random.choice(unary_operators) + '(' + operand + ')', terminals_num
+        left, left_terminals = self.expression(depth - 1, variables, callees)
+        right, right_terminals = self.expression(depth - 1, variables, callees)
+        if choice < 0.3 and callees:
+            return '{0}({1}, {2})'.format(self.random.choice(callees), left, right), left_terminals + right_terminals
+        operator = self.random.choice(binary_operators)
+        return '(' + left + ' ' + operator + ' ' + right + ')', left_terminals + right_terminals
+
+
+def generate(output_path, files_num, functions_num, depth, terminals, template_density, headers_num, fan_out,
+             header_functions, seed):
+    generator = CorpusGenerator(depth, terminals, template_density, header_functions, seed)
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+    for header_id in range(headers_num):
+        with open(os.path.join(output_path, 'header{0}.h'.format(header_id)), 'w') as file:
+            file.write(generator.header(header_id))
+    for file_id in range(files_num):
+        headers = sorted(generator.random.sample(range(headers_num), min(fan_out, headers_num)))
+        with open(os.path.join(output_path, 'file{0}.cc'.format(file_id)), 'w') as file:
+            file.write(generator.source(file_id, functions_num, headers))
+    # the shape of the corpus is reported with the benchmark results
+    parameters = {'files': files_num, 'functions': functions_num, 'depth': depth, 'terminals': terminals,
+                  'template_density': template_density, 'headers': headers_num, 'fan_out': fan_out,
+                  'header_functions': header_functions, 'seed': seed}
+    with open(os.path.join(output_path, 'corpus.json'), 'w') as file:
+        json.dump(parameters, file, indent=2)
+    return parameters
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='generates synthetic C++ sources for the miner benchmark')
+
+    args_parser.add_argument('OutPath',
+                             metavar='out',
+                             type=str,
+                             help='the output path')
+
+    args_parser.add_argument('-n', '--files',
+                             metavar='files-number',
+                             type=int,
+                             help='number of source files, default(20)',
+                             default=20,
+                             required=False)
+
+    args_parser.add_argument('-f', '--functions',
+                             metavar='functions-number',
+                             type=int,
+                             help='number of functions per source file, default(20)',
+                             default=20,
+                             required=False)
+
+    args_parser.add_argument('-d', '--depth',
+                             metavar='expression-depth',
+                             type=int,
+                             help='depth of expressions in function statements, default(3)',
+                             default=3,
+                             required=False)
+
+    args_parser.add_argument('-t', '--terminals',
+                             metavar='terminals-number',
+                             type=int,
+                             help='number of terminals per function, default(40)',
+                             default=40,
+                             required=False)
+
+    args_parser.add_argument('-T', '--template_density',
+                             metavar='fraction',
+                             type=float,
+                             help='fraction of function templates, default(0.2)',
+                             default=0.2,
+                             required=False)
+
+    args_parser.add_argument('-H', '--headers',
+                             metavar='headers-number',
+                             type=int,
+                             help='number of shared headers, default(8)',
+                             default=8,
+                             required=False)
+
+    args_parser.add_argument('-o', '--fan_out',
+                             metavar='headers-number',
+                             type=int,
+                             help='number of headers included by each source file, default(3)',
+                             default=3,
+                             required=False)
+
+    args_parser.add_argument('--header_functions',
+                             metavar='functions-number',
+                             type=int,
+                             help='number of inline functions per header, default(5)',
+                             default=5,
+                             required=False)
+
+    args_parser.add_argument('-s', '--seed',
+                             metavar='random-seed',
+                             type=int,
+                             help='seed of the generator, default(0)',
+                             default=0,
+                             required=False)
+
+    args = args_parser.parse_args()
+    corpus = generate(args.OutPath, args.files, args.functions, args.depth, args.terminals, args.template_density,
+                      args.headers, args.fan_out, args.header_functions, args.seed)
+    print('Corpus: ' + json.dumps(corpus))
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+bench_path = os.path.dirname(os.path.abspath(__file__))
+root_path = os.path.dirname(bench_path)
+miner_path = os.path.join(root_path, 'src', 'miner.py')
+
+# the save time isn't reported: samples are written by the writer of each process and flushed when it's closed,
+# after the metrics of its last file are reported
+stages = ['parse_time', 'traversal_time', 'graph_time', 'paths_time']
+# settings of the miner options -c, -l, -d and -p measured by default
+default_settings = ['c=200,l=8,d=0,p=1', 'c=1000,l=0,d=0,p=1', 'c=200,l=8,d=8,p=1', 'c=200,l=8,d=0,p={0}']
+options = {'c': '--max_contexts_num', 'l': '--max_path_len', 'd': '--max_ast_depth', 'p': '--processes_num'}
+
+
+def parse_settings(settings):
+    # 'c=200,l=8,d=0,p=2' to the dictionary of miner options
+    result = {}
+    for item in settings.split(','):
+        name, value = item.split('=')
+        if name not in options:
+            raise ValueError('Unknown setting: ' + name)
+        result[name] = int(value)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root_path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_miner(corpus_path, settings, extra_args):
+    # runs the miner once and returns the wall time, the maximum RSS of a single process and per-file metrics
+    out_path = tempfile.mkdtemp(prefix='cppminer_bench_')
+    metrics_path = os.path.join(out_path, 'metrics.jsonl')
+    command = [sys.executable, miner_path]
+    for name, value in sorted(settings.items()):
+        command += [options[name], str(value)]
+    command += ['--metrics', metrics_path] + extra_args + [corpus_path, os.path.join(out_path, 'out')]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = root_path + os.pathsep + env.get('PYTHONPATH', '')
+    try:
+        with open(os.path.join(out_path, 'miner.log'), 'w+') as log:
+            start_time = time.perf_counter()
+            process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+            # the maximum RSS of the waited process is the largest RSS of it or any of its terminated
+            # descendants, not the RSS of all processes together
+            _, status, usage = os.wait4(process.pid, 0)
+            wall_time = time.perf_counter() - start_time
+            process.returncode = os.waitstatus_to_exitcode(status)
+            if process.returncode != 0:
+                log.seek(0)
+                raise RuntimeError('Miner failed: ' + ' '.join(command) + '\n' + log.read())
+        with open(metrics_path, 'r') as file:
+            records = [json.loads(line) for line in file]
+    finally:
+        shutil.rmtree(out_path, ignore_errors=True)
+    return wall_time, usage.ru_maxrss * 1024, records
+
+
+def summarize(settings, wall_times, max_process_rss, records):
+    wall_time = min(wall_times)
+    files_num = len(records)
+    functions_num = sum(record['functions_num'] for record in records)
+    contexts_num = sum(record['contexts_num'] for record in records)
+    return {'settings': settings,
+            'wall_time': wall_time,
+            'wall_times': wall_times,
+            'files': files_num,
+            'functions': functions_num,
+            'contexts': contexts_num,
+            'files_per_s': files_num / wall_time,
+            'functions_per_s': functions_num / wall_time,
+            'contexts_per_s': contexts_num / wall_time,
+            # stage times are summed over processes
+            'stages': {name: sum(record[name] for record in records) for name in stages},
+            'max_process_rss_mb': max_process_rss / (1024 * 1024)}
+
+
+def run_benchmark(corpus_path, settings_list, repeats, extra_args):
+    results = []
+    for settings in settings_list:
+        wall_times = []
+        max_process_rss = 0
+        fastest_records = None
+        for _ in range(repeats):
+            wall_time, rss, records = run_miner(corpus_path, settings, extra_args)
+            # stage times are reported for the fastest run as the throughput
+            if not wall_times or wall_time < min(wall_times):
+                fastest_records = records
+            wall_times.append(wall_time)
+            max_process_rss = max(max_process_rss, rss)
+        result = summarize(settings, wall_times, max_process_rss, fastest_records)
+        print('{0}: {1:.2f} files/s {2:.2f} functions/s {3:.1f} contexts/s max process RSS {4:.1f} MB'.format(
+            settings, result['files_per_s'], result['functions_per_s'], result['contexts_per_s'],
+            result['max_process_rss_mb']), file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def settings_key(settings):
+    return ','.join('{0}={1}'.format(name, settings[name]) for name in sorted(settings))
+
+
+def compare(results, baseline_path):
+    # relative throughput of runs with the same settings in the baseline results file
+    with open(baseline_path, 'r') as file:
+        baseline = {settings_key(run['settings']): run for run in json.load(file)['runs']}
+    for run in results:
+        key = settings_key(run['settings'])
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        print('{0}: contexts/s x{1:.2f} wall time x{2:.2f} max process RSS x{3:.2f}'.format(
+            key, run['contexts_per_s'] / base['contexts_per_s'] if base['contexts_per_s'] else 0.0,
+            run['wall_time'] / base['wall_time'], run['max_process_rss_mb'] / base['max_process_rss_mb']),
+            file=sys.stderr)
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='measures the miner throughput on a corpus')
+
+    args_parser.add_argument('Path',
+                             metavar='path',
+                             type=str,
+                             help='the corpus path, see generate_corpus.py')
+
+    args_parser.add_argument('-s', '--settings',
+                             metavar='settings',
+                             type=str,
+                             action='append',
+                             help='miner options to measure as c=contexts,l=path-length,d=ast-depth,p=processes, '
+                                  'can be repeated, default({0})'.format(' '.join(default_settings).format('cpus-number')),
+                             required=False)
+
+    args_parser.add_argument('-r', '--repeats',
+                             metavar='repeats-number',
+                             type=int,
+                             help='number of runs of each settings, the fastest one is reported, default(1)',
+                             default=1,
+                             required=False)
+
+    args_parser.add_argument('-o', '--output',
+                             metavar='output-path',
+                             type=str,
+                             help='JSON file with results, default(standard output)',
+                             required=False)
+
+    args_parser.add_argument('-b', '--baseline',
+                             metavar='baseline-path',
+                             type=str,
+                             help='JSON file with results of another commit to compare with',
+                             required=False)
+
+    args_parser.add_argument('-e', '--libclang',
+                             metavar='libclang-path',
+                             type=str,
+                             help='path to libclang.so file',
+                             required=False)
+
+    args = args_parser.parse_args()
+
+    corpus_path = os.path.abspath(args.Path)
+    settings_list = []
+    for settings in args.settings or default_settings:
+        settings = parse_settings(settings.format(os.cpu_count() or 1))
+        if settings not in settings_list:
+            settings_list.append(settings)
+    extra_args = ['--libclang', args.libclang] if args.libclang else []
+    corpus = None
+    if os.path.isfile(os.path.join(corpus_path, 'corpus.json')):
+        with open(os.path.join(corpus_path, 'corpus.json'), 'r') as file:
+            corpus = json.load(file)
+
+    runs = run_benchmark(corpus_path, settings_list, args.repeats, extra_args)
+    report = {'commit': git_commit(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'cpu_count': os.cpu_count(),
+              'corpus': corpus,
+              'runs': runs}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        compare(runs, args.baseline)
@@ -1,6 +1,8 @@
+import heapq
 import re
 import subprocess
 import sys
+from operator import itemgetter
 
 
 class Common:
@@ -27,8 +29,11 @@ class Common:
                 if not len(parts) == 2:
                     continue
                 histogram[parts[0]] = int(parts[1])
+        if max_size is not None:
+            # the top of the histogram is selected without sorting all words
+            return dict(heapq.nlargest(max_size, histogram.items(), key=itemgetter(1)))
         sorted_histogram = [(k, histogram[k]) for k in sorted(histogram, key=histogram.get, reverse=True)]
-        return dict(sorted_histogram[:max_size])
+        return dict(sorted_histogram)
 
     @staticmethod
     def load_vocab_from_dict(word_to_count, add_values=[], max_size=None):
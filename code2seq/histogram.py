@@ -0,0 +1,155 @@
+import heapq
+import os
+from argparse import ArgumentParser
+from collections import Counter
+from multiprocessing import Pool
+from operator import itemgetter
+
+'''
+This script builds the target, subtoken and node histograms of the training data in one pass.
+The file is split to byte ranges counted by parallel processes, tokens are counted the same way as the
+cut | tr | awk pipelines did: the target is the first space-delimited field, subtokens are the first and the third
+comma-delimited parts of each context, nodes are the second one.
+'''
+
+
+# all bytes except delimiters of fields
+NOT_DELIMITERS = bytes(byte for byte in range(256) if byte not in b' ,\n')
+
+
+def is_regular(block):
+    # each line is the target followed by one or more contexts with exactly three parts,
+    # so the line delimiters are ' ,,' repeated and the line end
+    delimiters = block.translate(None, NOT_DELIMITERS)
+    if delimiters.startswith(b'\n') or b'\n\n' in delimiters:
+        return False
+    return not delimiters.replace(b' ,,', b'').strip(b'\n')
+
+
+def count_lines(lines, target_to_count, subtoken_to_count, node_to_count):
+    targets = []
+    subtokens = []
+    nodes = []
+    for line in lines:
+        fields = line.split(b' ')
+        targets += fields[0].split(b'|')
+        # cut -f2- outputs lines without delimiters as is
+        for context in fields[1:] if len(fields) > 1 else fields:
+            parts = context.split(b',')
+            if len(parts) == 1:
+                # cut outputs a field without delimiters as is for both parts
+                subtokens += context.split(b'|')
+                nodes += context.split(b'|')
+                continue
+            subtokens += parts[0].split(b'|')
+            if len(parts) > 2:
+                subtokens += parts[2].split(b'|')
+            nodes += parts[1].split(b'|')
+    target_to_count.update(targets)
+    subtoken_to_count.update(subtokens)
+    node_to_count.update(nodes)
+
+
+def count_block(block, target_to_count, subtoken_to_count, node_to_count):
+    # block is a sequence of complete lines
+    if not block.endswith(b'\n'):
+        block += b'\n'
+    if not is_regular(block):
+        count_lines(block[:-1].split(b'\n'), target_to_count, subtoken_to_count, node_to_count)
+        return
+    # regular lines are split to tokens with a few bulk operations instead of a loop over contexts
+    targets = []
+    contexts = []
+    for line in block[:-1].split(b'\n'):
+        target, _, line_contexts = line.partition(b' ')
+        targets.append(target)
+        contexts.append(line_contexts)
+    parts = b' '.join(contexts).replace(b' ', b',').split(b',')
+    target_to_count.update(b'|'.join(targets).split(b'|'))
+    subtoken_to_count.update(b'|'.join(parts[0::3]).split(b'|'))
+    subtoken_to_count.update(b'|'.join(parts[2::3]).split(b'|'))
+    node_to_count.update(b'|'.join(parts[1::3]).split(b'|'))
+
+
+def count_range(args):
+    file_path, start, end, block_size = args
+    target_to_count = Counter()
+    subtoken_to_count = Counter()
+    node_to_count = Counter()
+    with open(file_path, 'rb') as file:
+        # a line belongs to the range containing its first byte
+        if start > 0:
+            file.seek(start - 1)
+            file.readline()
+        position = file.tell()
+        while position < end:
+            # blocks are cut at line ends, the last line of the range is read to its end
+            block = file.read(min(block_size, end - position))
+            if not block:
+                break
+            position += len(block)
+            if not block.endswith(b'\n'):
+                tail = file.readline()
+                position += len(tail)
+                block += tail
+            count_block(block, target_to_count, subtoken_to_count, node_to_count)
+    return target_to_count, subtoken_to_count, node_to_count
+
+
+def build_histograms(file_path, num_threads=1, chunks_per_thread=4, block_size=4 << 20):
+    file_size = os.path.getsize(file_path)
+    chunks_num = max(num_threads * chunks_per_thread, 1)
+    chunk_size = max(file_size // chunks_num + 1, 1)
+    ranges = [(file_path, start, min(start + chunk_size, file_size), block_size)
+              for start in range(0, file_size, chunk_size)]
+    target_to_count = Counter()
+    subtoken_to_count = Counter()
+    node_to_count = Counter()
+    # counters of ranges are merged in the file order, so words with equal counts keep the order of the first occurrence
+    with Pool(num_threads) as pool:
+        for targets, subtokens, nodes in pool.imap(count_range, ranges):
+            target_to_count.update(targets)
+            subtoken_to_count.update(subtokens)
+            node_to_count.update(nodes)
+    return target_to_count, subtoken_to_count, node_to_count
+
+
+def save_histogram(word_to_count, file_path, max_size=None):
+    if max_size is not None:
+        # top words are selected without sorting the whole histogram
+        items = heapq.nlargest(max_size, word_to_count.items(), key=itemgetter(1))
+    else:
+        items = word_to_count.items()
+    with open(file_path, 'wb') as file:
+        for word, count in items:
+            file.write(word + b' ' + str(count).encode('ascii') + b'\n')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("-trd", "--train_data", dest="train_data_path",
+                        help="path to training data file", required=True)
+    parser.add_argument("-sh", "--subtoken_histogram", dest="subtoken_histogram",
+                        help="subtoken histogram file", metavar="FILE", required=True)
+    parser.add_argument("-nh", "--node_histogram", dest="node_histogram",
+                        help="node_histogram file", metavar="FILE", required=True)
+    parser.add_argument("-th", "--target_histogram", dest="target_histogram",
+                        help="target histogram file", metavar="FILE", required=True)
+    parser.add_argument("-svs", "--subtoken_vocab_size", dest="subtoken_vocab_size", default=None,
+                        help="Max number of source subtokens to keep in the histogram", required=False)
+    parser.add_argument("-tvs", "--target_vocab_size", dest="target_vocab_size", default=None,
+                        help="Max number of target words to keep in the histogram", required=False)
+    parser.add_argument("-nt", "--num_threads", dest="num_threads", default=1,
+                        help="number of parallel processes", required=False)
+    args = parser.parse_args()
+
+    target_to_count, subtoken_to_count, node_to_count = build_histograms(args.train_data_path,
+                                                                         int(args.num_threads))
+    save_histogram(target_to_count, args.target_histogram,
+                   int(args.target_vocab_size) if args.target_vocab_size else None)
+    save_histogram(subtoken_to_count, args.subtoken_histogram,
+                   int(args.subtoken_vocab_size) if args.subtoken_vocab_size else None)
+    save_histogram(node_to_count, args.node_histogram)
+    print('target histogram size: ', len(target_to_count))
+    print('subtoken histogram size: ', len(subtoken_to_count))
+    print('node histogram size: ', len(node_to_count))
@@ -1,5 +1,9 @@
+import mmap
+import os
 import pickle
+import shutil
 from argparse import ArgumentParser
+from multiprocessing import Pool
 
 import numpy as np
 
@@ -22,17 +26,37 @@ def save_dictionaries(dataset_name, subtoken_to_count, node_to_count, target_to_
         print('Dictionaries saved to: {}'.format(save_dict_file_path))
 
 
-def process_file(file_path, data_file_role, dataset_name, max_contexts, max_data_contexts):
+def chunk_bounds(file_path, chunk_size):
+    # byte ranges of the file aligned to line ends
+    with open(file_path, 'rb') as file:
+        file_size = os.fstat(file.fileno()).st_size
+        if file_size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            bounds = [0]
+            while bounds[-1] + chunk_size < file_size:
+                position = data.find(b'\n', bounds[-1] + chunk_size)
+                if position < 0:
+                    break
+                bounds.append(position + 1)
+            if bounds[-1] < file_size:
+                bounds.append(file_size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def process_chunk(args):
+    file_path, start, end, output_path, seed, max_contexts_to_sample, max_data_contexts = args
+    # each chunk has its own random generator, so the output doesn't depend on the scheduling of chunks
+    rng = np.random.default_rng(seed)
+    padding = b' ' * max_data_contexts
     sum_total = 0
     sum_sampled = 0
     total = 0
     max_unfiltered = 0
-    max_contexts_to_sample = max_data_contexts if data_file_role == 'train' else max_contexts
-    output_path = '{}.{}.c2s'.format(dataset_name, data_file_role)
-    with open(output_path, 'w') as outfile:
-        with open(file_path, 'r') as file:
-            for line in file:
-                parts = line.rstrip('\n').split(' ')
+    with open(file_path, 'rb') as file, open(output_path, 'wb') as outfile:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in data[start:end].splitlines():
+                parts = line.split(b' ')
                 target_name = parts[0]
                 contexts = parts[1:]
 
@@ -41,15 +65,46 @@ def process_file(file_path, data_file_role, dataset_name, max_contexts, max_data
 
                 sum_total += len(contexts)
                 if len(contexts) > max_contexts_to_sample:
-                    contexts = np.random.choice(contexts, max_contexts_to_sample, replace=False)
+                    # indices are sampled instead of the contexts list converted to an array
+                    indices = rng.choice(len(contexts), max_contexts_to_sample, replace=False)
+                    contexts = [contexts[index] for index in indices]
 
                 sum_sampled += len(contexts)
 
-                csv_padding = " " * (max_data_contexts - len(contexts))
                 total += 1
-                outfile.write(target_name + ' ' + " ".join(contexts) + csv_padding + '\n')
+                outfile.write(target_name + b' ' + b' '.join(contexts) +
+                              padding[:max(max_data_contexts - len(contexts), 0)] + b'\n')
+    return sum_total, sum_sampled, total, max_unfiltered
+
 
-    print('File: ' + data_file_path)
+def process_file(file_path, data_file_role, dataset_name, max_contexts, max_data_contexts, num_threads=1, seed=None,
+                 chunk_size=64 * 1024 * 1024):
+    max_contexts_to_sample = max_data_contexts if data_file_role == 'train' else max_contexts
+    output_path = '{}.{}.c2s'.format(dataset_name, data_file_role)
+    # the file is split to chunks processed in parallel, outputs of chunks are concatenated in the file order;
+    # chunks don't depend on the number of processes, so the output is defined by the seed only
+    chunks = chunk_bounds(file_path, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(file_path, start, end, '{}.part{}'.format(output_path, index), seeds[index], max_contexts_to_sample,
+              max_data_contexts) for index, (start, end) in enumerate(chunks)]
+    if num_threads > 1:
+        with Pool(num_threads) as pool:
+            results = pool.map(process_chunk, tasks)
+    else:
+        results = [process_chunk(task) for task in tasks]
+
+    with open(output_path, 'wb') as outfile:
+        for task in tasks:
+            with open(task[3], 'rb') as part_file:
+                shutil.copyfileobj(part_file, outfile)
+            os.remove(task[3])
+
+    sum_total = sum(result[0] for result in results)
+    sum_sampled = sum(result[1] for result in results)
+    total = sum(result[2] for result in results)
+    max_unfiltered = max([result[3] for result in results] + [0])
+
+    print('File: ' + file_path)
     print('Average total contexts: ' + str(float(sum_total) / total))
     print('Average final (after sampling) contexts: ' + str(float(sum_sampled) / total))
     print('Total examples: ' + str(total))
@@ -89,6 +144,10 @@ if __name__ == '__main__':
                         help="node_histogram file", metavar="FILE", required=True)
     parser.add_argument("-th", "--target_histogram", dest="target_histogram",
                         help="target histogram file", metavar="FILE", required=True)
+    parser.add_argument("-nt", "--num_threads", dest="num_threads", default=1,
+                        help="number of parallel processes", required=False)
+    parser.add_argument("-s", "--seed", dest="seed", default=None,
+                        help="seed of the contexts sampling, default(random)", required=False)
     parser.add_argument("-o", "--output_name", dest="output_name",
                         help="output name - the base name for the created dataset", required=True, default='data')
     args = parser.parse_args()
@@ -112,7 +171,9 @@ if __name__ == '__main__':
     num_training_examples = 0
     for data_file_path, data_role in zip([test_data_path, val_data_path, train_data_path], ['test', 'val', 'train']):
         num_examples = process_file(file_path=data_file_path, data_file_role=data_role, dataset_name=args.output_name,
-                                    max_contexts=int(args.max_contexts), max_data_contexts=int(args.max_data_contexts))
+                                    max_contexts=int(args.max_contexts), max_data_contexts=int(args.max_data_contexts),
+                                    num_threads=int(args.num_threads),
+                                    seed=int(args.seed) if args.seed is not None else None)
         if data_role == 'train':
             num_training_examples = num_examples
 
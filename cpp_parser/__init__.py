@@ -1,4 +1,15 @@
 from .context import Context
 from .path import Path
 from .sample import Sample
-from .ast_parser import AstParser
+
+
+def __getattr__(name):
+    # the parser needs libclang and networkx, they are imported only when it's used,
+    # so the shard formats can be read without them
+    if name == 'AstParser':
+        from .ast_parser import AstParser
+        return AstParser
+    if name == 'PchCache':
+        from .pch_cache import PchCache
+        return PchCache
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
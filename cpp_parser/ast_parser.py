@@ -2,14 +2,22 @@ from clang.cindex import Index
 from .sample import Sample
 from .context import Context
 from .path import Path
-from .ast_utils import ast_to_graph, is_function, is_class, is_operator_token, is_namespace, make_ast_err_message
-from networkx.algorithms import shortest_path
+from .ast_utils import ast_to_graph, is_function, is_class, is_operator_token, is_namespace, make_ast_err_message, \
+    source_file
+from .path_engine import path_engines
+from .source_cache import SourceCache
+from .cursor_record import CursorRecord, CallCounter
+from .metrics import FileMetrics
+from .binary_shard import ShardWriter
+from .shards import RollingShardWriter, BackgroundWriter
+from .pair_sampler import sample_pairs
 from networkx.drawing.nx_agraph import to_agraph
-from itertools import combinations
-import uuid
 import os
 import re
 import random
+import sys
+import time
+from functools import lru_cache
 
 
 def debug_save_graph(func_node, g):
@@ -18,14 +26,17 @@ def debug_save_graph(func_node, g):
     while os.path.exists(file_name):
         file_name = func_node.spelling + str(num) + ".png"
         num += 1
-    a = to_agraph(g)
+    a = to_agraph(g.to_networkx())
     a.draw(file_name, prog='dot')
     a.clear()
 
 
+@lru_cache(maxsize=1 << 16)
 def tokenize(name, max_subtokens_num):
+    # the same identifiers and type names are tokenized many times, results are cached as tuples
+    # of interned strings, so repeated sub-tokens share one object
     if is_operator_token(name):
-        return [name]
+        return sys.intern(name),
     first_tokens = name.split('_')
     str_tokens = []
     for token in first_tokens:
@@ -34,38 +45,69 @@ def tokenize(name, max_subtokens_num):
     assert len(str_tokens) > 0, "Can't tokenize expr: {0}".format(name)
     if max_subtokens_num != 0:
         str_tokens = str_tokens[:max_subtokens_num]
-    return str_tokens
+    return tuple(sys.intern(t) for t in str_tokens)
 
 
 class AstParser:
-    def __init__(self, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, out_path):
+    def __init__(self, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, out_path,
+                 path_engine='tree', mmap_sources=False, shard_format='text', pairs_budget=100000,
+                 compression=None, shard_max_bytes=256 * 1024 * 1024, shard_max_samples=0, writer_queue_size=0):
         self.validate = False
         self.save_buffer_size = 1000
         self.out_path = out_path
+        self.shard_format = shard_format
+        self.shard_extension = '.c2b' if shard_format == 'binary' else '.c2s'
+        # samples of all files are appended to large rotated files unless they are saved per translation unit
+        self.writer = RollingShardWriter(out_path, shard_format, compression, shard_max_bytes, shard_max_samples)
+        if writer_queue_size:
+            self.writer = BackgroundWriter(self.writer, writer_queue_size)
         self.max_subtokens_num = max_subtokens_num
         self.max_contexts_num = max_contexts_num
         self.max_path_len = max_path_len
         self.max_ast_depth = max_ast_depth
+        self.pairs_budget = pairs_budget
+        self.path_engine = path_engines[path_engine]
+        self.source_cache = SourceCache(use_mmap=mmap_sources)
         self.index = Index.create()
         self.samples = set()
+        # number of samples handed off to the writer since the last flush
+        self.unflushed_samples_num = 0
         self.header_only_functions = set()
+        # headers whose functions were taken by the last parsed translation unit
+        self.function_headers = set()
+        # working directory of the compilation command of the last parsed translation unit
+        self.directory = None
+        self.shared_functions = None
+        self.pch_cache = None
+        self.metrics = FileMetrics(None)
 
-    def __del__(self):
+    def close(self):
+        # writes remaining samples and waits for the writer, the parser can't be used after that
         self.save()
+        self.writer.close()
 
     def __parse_node(self, node):
         try:
-            namespaces = [x for x in node.get_children() if is_namespace(x)]
+            # children are classified in one pass, namespaces are parsed first, then functions and classes
+            namespaces = []
+            functions = []
+            classes = []
+            for x in node.get_children():
+                if is_namespace(x):
+                    namespaces.append(x)
+                if is_function(x):
+                    functions.append(x)
+                if is_class(x):
+                    classes.append(x)
+
             for n in namespaces:
                 # ignore standard library functions
                 if n.displayname != 'std' and not n.displayname.startswith('__'):
                     self.__parse_node(n)
 
-            functions = [x for x in node.get_children() if is_function(x)]
             for f in functions:
                 self.__parse_function(f)
 
-            classes = [x for x in node.get_children() if is_class(x)]
             for c in classes:
                 methods = [x for x in c.get_children() if is_function(x)]
                 for m in methods:
@@ -75,28 +117,83 @@ class AstParser:
                 msg = make_ast_err_message(str(e), node)
                 raise Exception(msg)
 
-        self.__dump_samples()
-
-    def parse(self, compiler_args, file_path=None):
-        ast = self.index.parse(file_path, compiler_args)
-        self.__parse_node(ast.cursor)
+    def parse(self, compiler_args, file_path=None, shard_name=None, directory=None):
+        self.metrics = FileMetrics(file_path)
+        self.function_headers = set()
+        self.directory = directory
+        start_time = time.perf_counter()
+        if self.pch_cache is not None and file_path is not None:
+            ast = self.pch_cache.parse(self.index, compiler_args, file_path)
+        else:
+            ast = self.index.parse(file_path, compiler_args)
+        parse_end_time = time.perf_counter()
+        self.metrics.parse_time = parse_end_time - start_time
+        # properties of cursors are fetched from libclang once per translation unit
+        counter = CallCounter()
+        self.__parse_node(CursorRecord(ast.cursor, counter))
+        self.metrics.libclang_calls = counter.calls
+        self.metrics.libclang_cached_calls = counter.cached_calls
+        # the traversal time is the time of the cursors walk without functions processing
+        self.metrics.traversal_time = (time.perf_counter() - parse_end_time -
+                                       self.metrics.graph_time - self.metrics.paths_time)
+        if shard_name is not None:
+            # samples of the translation unit replace its previous shard
+            self.save(shard_name)
+        else:
+            self.__dump_samples()
+        return ast
 
     def __dump_samples(self):
         if len(self.samples) >= self.save_buffer_size:
-            self.save()
+            # samples are handed off to the writer without waiting for the file
+            self.save(wait=False)
 
-    def save(self):
+    def save(self, shard_name=None, wait=True):
         if not self.out_path:
             return
+        start_time = time.perf_counter()
+        self.__save(shard_name, wait)
+        self.metrics.save_time += time.perf_counter() - start_time
+
+    def flush(self, on_flushed, complete=True):
+        # hands off buffered samples to the writer and calls on_flushed once they are written to the file,
+        # a background writer calls it from its thread while the parser goes on; without complete an lzma file
+        # isn't ended, on_flushed is called when it's rotated
+        self.save(wait=False)
+        self.writer.flush(on_flushed, complete, wait=False)
+        self.unflushed_samples_num = 0
+
+    def __save(self, shard_name, wait):
         if not os.path.exists(self.out_path):
             os.makedirs(self.out_path)
-        if len(self.samples) > 0:
-            file_name = os.path.join(self.out_path, str(uuid.uuid4().hex) + ".c2s")
-            # print(file_name)
-            with open(file_name, "w") as file:
+        if shard_name is not None:
+            file_name = os.path.join(self.out_path, shard_name)
+            if len(self.samples) == 0:
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+                return
+            self.__write_samples(file_name + '.tmp')
+            os.replace(file_name + '.tmp', file_name)
+        else:
+            if len(self.samples) > 0:
+                # the writer can keep the set until it's written, so new samples go to a new one
+                self.writer.write(self.samples)
+                self.unflushed_samples_num += len(self.samples)
+                self.samples = set()
+            if wait:
+                self.writer.flush()
+                self.unflushed_samples_num = 0
+
+    def __write_samples(self, file_name):
+        if self.shard_format == 'binary':
+            with open(file_name, 'wb') as file:
+                writer = ShardWriter(file)
                 for sample in self.samples:
-                    file.write(str(sample.source_mark) + str(sample) + "\n")
-            self.samples.clear()
+                    writer.write(sample)
+        else:
+            with open(file_name, "w") as file:
+                file.writelines(str(sample.source_mark) + str(sample) + "\n" for sample in self.samples)
+        self.samples.clear()
 
     def __parse_function(self, func_node):
         try:
@@ -105,54 +202,75 @@ class AstParser:
                 return
 
             # detect header only function duplicates
-            file_name = func_node.location.file.name
-            source_mark = (file_name, func_node.extent.start.line)
-            if file_name.endswith('.h') and func_node.is_definition:
+            # source marks are absolute paths, so they are the same for all compilation directories
+            function_file = source_file(func_node, self.directory)
+            source_mark = (function_file, func_node.extent.start.line)
+            if function_file.endswith('.h') and func_node.is_definition:
                 # print('Header only function: {0}'.format(func_node.displayname))
                 if source_mark in self.header_only_functions:
                     # print('Duplicate')
                     return
                 else:
                     self.header_only_functions.add(source_mark)
+                # the function can be already taken by another parser process
+                if self.shared_functions is not None and not self.shared_functions.add(source_mark):
+                    return
+                self.function_headers.add(function_file)
 
+            start_time = time.perf_counter()
             key = tokenize(func_node.spelling, self.max_subtokens_num)
-            g = ast_to_graph(func_node, self.max_ast_depth)
+            g = ast_to_graph(func_node, self.max_ast_depth, self.source_cache, self.directory)
+            # the cursors of the function body aren't needed anymore
+            func_node.release()
+            graph_end_time = time.perf_counter()
 
             # debug_save_graph(func_node, g)
 
-            terminal_nodes = [node for (node, degree) in g.degree() if degree == 1]
+            terminal_nodes = g.terminal_nodes()
             random.shuffle(terminal_nodes)
 
-            contexts = set()
-            ends = combinations(terminal_nodes, 2)
+            # equal contexts are stored once, the order of sampling is kept
+            contexts = {}
+            depths = g.depths
+            paths = self.path_engine(g)
 
-            for start, end in ends:
-                path = shortest_path(g, start, end)
+            # random distinct pairs of terminals limited by the budget
+            for start_index, end_index in sample_pairs(len(terminal_nodes), self.pairs_budget):
+                start = terminal_nodes[start_index]
+                end = terminal_nodes[end_index]
+                # the path can't be shorter than the depths difference
+                if self.max_path_len != 0 and abs(depths[start] - depths[end]) + 1 > self.max_path_len:
+                    continue
+                path = paths.path(start, end)
                 if path:
                     if self.max_path_len != 0 and len(path) > self.max_path_len:
                         continue  # skip too long paths
                     path = path[1:-1]
-                    start_node = g.nodes[start]['label']
-                    tokenize_start_node = not g.nodes[start]['is_reserved']
-                    end_node = g.nodes[end]['label']
-                    tokenize_end_node = not g.nodes[end]['is_reserved']
+                    start_node = g.label(start)
+                    tokenize_start_node = not g.is_reserved(start)
+                    end_node = g.label(end)
+                    tokenize_end_node = not g.is_reserved(end)
 
-                    path_tokens = []
-                    for path_item in path:
-                        path_node = g.nodes[path_item]['label']
-                        path_tokens.append(path_node)
+                    path_tokens = [g.label(path_item) for path_item in path]
 
                     context = Context(
-                        tokenize(start_node, self.max_subtokens_num) if tokenize_start_node else [start_node],
-                        tokenize(end_node, self.max_subtokens_num) if tokenize_end_node else [end_node],
+                        tokenize(start_node, self.max_subtokens_num) if tokenize_start_node else (start_node,),
+                        tokenize(end_node, self.max_subtokens_num) if tokenize_end_node else (end_node,),
                         Path(path_tokens, self.validate), self.validate)
-                    contexts.add(context)
+                    contexts[context] = None
                 if len(contexts) > self.max_contexts_num:
                     break
 
             if len(contexts) > 0:
-                sample = Sample(key, contexts, source_mark, self.validate)
+                sample = Sample(key, list(contexts), source_mark, self.validate)
                 self.samples.add(sample)
+
+            end_time = time.perf_counter()
+            self.metrics.graph_time += graph_end_time - start_time
+            self.metrics.paths_time += end_time - graph_end_time
+            self.metrics.functions_num += 1
+            self.metrics.contexts_num += len(contexts)
+            self.metrics.add_function(source_mark, func_node.spelling, end_time - start_time)
         except Exception as e:
             # skip unknown cursor exceptions
             if 'Unknown template argument kind' not in str(e):
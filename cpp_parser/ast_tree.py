@@ -0,0 +1,85 @@
+from array import array
+import sys
+
+import networkx as nx
+
+
+class AstTree:
+    # nodes are integer ids in the order of creation, the structure is stored in flat arrays
+    # and node labels are interned into the per-tree label table, label strings are interned
+    # process-wide so paths of all samples share them
+    def __init__(self):
+        self.parents = array('i')
+        self.depths = array('i')
+        self.child_counts = array('i')
+        self.label_ids = array('i')
+        self.reserved = bytearray()
+        self.label_table = []
+        self.label_index = {}
+        self.child_offsets = None
+        self.child_table = None
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add_node(self, label, is_reserved=True, parent_id=None):
+        label_id = self.label_index.get(label)
+        if label_id is None:
+            label_id = len(self.label_table)
+            self.label_table.append(sys.intern(label))
+            self.label_index[label] = label_id
+
+        node_id = len(self.parents)
+        if parent_id is None:
+            self.parents.append(-1)
+            self.depths.append(0)
+        else:
+            self.parents.append(parent_id)
+            self.depths.append(self.depths[parent_id] + 1)
+            self.child_counts[parent_id] += 1
+        self.child_counts.append(0)
+        self.label_ids.append(label_id)
+        self.reserved.append(is_reserved)
+        self.child_offsets = None
+        return node_id
+
+    def label(self, node_id):
+        return self.label_table[self.label_ids[node_id]]
+
+    def is_reserved(self, node_id):
+        return self.reserved[node_id] != 0
+
+    def degree(self, node_id):
+        return self.child_counts[node_id] + (1 if self.parents[node_id] >= 0 else 0)
+
+    def terminal_nodes(self):
+        return [node_id for node_id in range(len(self.parents)) if self.degree(node_id) == 1]
+
+    def children(self, node_id):
+        if self.child_offsets is None:
+            self.__build_child_table()
+        return self.child_table[self.child_offsets[node_id]:self.child_offsets[node_id + 1]]
+
+    def __build_child_table(self):
+        nodes_num = len(self.parents)
+        offsets = array('i', [0]) * (nodes_num + 1)
+        for node_id in range(nodes_num):
+            offsets[node_id + 1] = offsets[node_id] + self.child_counts[node_id]
+        positions = array('i', offsets)
+        table = array('i', [0]) * nodes_num
+        for node_id in range(nodes_num):
+            parent_id = self.parents[node_id]
+            if parent_id >= 0:
+                table[positions[parent_id]] = node_id
+                positions[parent_id] += 1
+        self.child_offsets = offsets
+        self.child_table = table
+
+    def to_networkx(self):
+        g = nx.Graph()
+        for node_id in range(len(self.parents)):
+            g.add_node(node_id, label=self.label(node_id), is_reserved=self.is_reserved(node_id))
+        for node_id in range(len(self.parents)):
+            for child_id in self.children(node_id):
+                g.add_edge(node_id, child_id)
+        return g
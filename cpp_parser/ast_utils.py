@@ -1,8 +1,8 @@
+import os
 import re
 
-import networkx as nx
-import uuid
 from clang.cindex import CursorKind, TokenKind
+from .ast_tree import AstTree
 
 
 def make_ast_err_message(msg, ast_node):
@@ -13,6 +13,14 @@ def make_ast_err_message(msg, ast_node):
     return msg
 
 
+def source_file(ast_node, directory=None):
+    # libclang reports file names relative to the working directory of the compilation command
+    name = ast_node.location.file.name
+    if directory is None:
+        return name
+    return os.path.normpath(os.path.join(directory, name))
+
+
 def is_node_kind_safe(node, kinds):
     try:
         return node.kind in kinds
@@ -36,11 +44,8 @@ def is_function(node):
                                 CursorKind.DESTRUCTOR,
                                 CursorKind.CONSTRUCTOR]):
         if node.is_definition():
-            not_empty = False
-            for _ in node.get_children():
-                not_empty = True
-                break
-            return not_empty
+            # declarations without a body have no children
+            return next(node.get_children(), None) is not None
     return False
 
 
@@ -97,62 +102,52 @@ def is_operator_token(token):
         return True
 
 
-def get_id():
-    node_id = uuid.uuid1()
-    return node_id.int
-
-
-def add_node(ast_node, graph):
+def add_node(ast_node, tree, parent_id, source_cache=None, directory=None):
     try:
-        node_id = ast_node.hash
-        kind = ast_node.kind.name
+        node_kind = ast_node.kind
+        kind = node_kind.name
         # skip meaningless AST primitives
-        if ast_node.kind == CursorKind.DECL_STMT or \
-           ast_node.kind == CursorKind.UNEXPOSED_EXPR:
-            return False
+        if node_kind == CursorKind.DECL_STMT or \
+           node_kind == CursorKind.UNEXPOSED_EXPR:
+            return None
 
         if is_operator(ast_node):
-            op_name = get_operator(ast_node)
+            op_name = get_operator(ast_node, source_cache, directory)
             kind = kind.strip() + "_" + "_".join(op_name)
 
-        graph.add_node(node_id, label=kind, is_reserved=True)
+        node_id = tree.add_node(kind, is_reserved=True, parent_id=parent_id)
 
         # print("Cursor kind : {0}".format(kind))
-        if ast_node.kind.is_declaration():
-            add_declaration(node_id, ast_node, graph)
+        if node_kind.is_declaration():
+            add_declaration(node_id, ast_node, tree)
         elif is_literal(ast_node):
-            add_literal(node_id, ast_node, graph)
+            add_literal(node_id, ast_node, tree)
         elif is_reference(ast_node):
-            add_reference(node_id, ast_node, graph)
+            add_reference(node_id, ast_node, tree)
         elif is_call_expr(ast_node):
-            add_call_expr(node_id, ast_node, graph)
+            add_call_expr(node_id, ast_node, tree)
 
-        return True
+        return node_id
     except Exception as e:
         if 'Unknown template argument kind' not in str(e):
             msg = make_ast_err_message(str(e), ast_node)
             raise Exception(msg)
 
 
-def add_child(graph, parent_id, name, is_reserved=True):
-    child_id = get_id()
+def add_child(tree, parent_id, name, is_reserved=True):
     assert len(name) > 0, "Missing node name"
-    graph.add_node(child_id, label=name, is_reserved=is_reserved)
-    graph.add_edge(parent_id, child_id)
+    tree.add_node(name, is_reserved=is_reserved, parent_id=parent_id)
 
 
-def add_intermediate_node(graph, parent_id, name):
-    child_id = get_id()
+def add_intermediate_node(tree, parent_id, name):
     assert len(name) > 0, "Missing node name"
-    graph.add_node(child_id, label=name, is_reserved=True)
-    graph.add_edge(parent_id, child_id)
-    return child_id
+    return tree.add_node(name, is_reserved=True, parent_id=parent_id)
 
 
-def add_call_expr(parent_id, ast_node, graph):
+def add_call_expr(parent_id, ast_node, tree):
     expr_type = ast_node.type.spelling
-    expr_type_node_id = add_intermediate_node(graph, parent_id, "EXPR_TYPE")
-    add_child(graph, expr_type_node_id, expr_type, is_reserved=False)
+    expr_type_node_id = add_intermediate_node(tree, parent_id, "EXPR_TYPE")
+    add_child(tree, expr_type_node_id, expr_type, is_reserved=False)
 
 
 def fix_cpp_operator_spelling(op_name):
@@ -168,18 +163,22 @@ def fix_cpp_operator_spelling(op_name):
         return op_name
 
 
-def get_operator(ast_node):
+def get_operator(ast_node, source_cache=None, directory=None):
     name_token = None
     for token in ast_node.get_tokens():
-        if is_operator_token(token.spelling):
+        # operators are punctuation tokens, spellings of other tokens aren't needed
+        if token.kind == TokenKind.PUNCTUATION and is_operator_token(token.spelling):
             name_token = token
             break
 
     if not name_token:
-        filename = ast_node.location.file.name
-        with open(filename, 'r') as fh:
-            contents = fh.read()
-        code_str = contents[ast_node.extent.start.offset: ast_node.extent.end.offset]
+        filename = source_file(ast_node, directory)
+        if source_cache is not None:
+            code_str = source_cache.get_text(filename, ast_node.extent.start.offset, ast_node.extent.end.offset)
+        else:
+            with open(filename, 'r') as fh:
+                contents = fh.read()
+            code_str = contents[ast_node.extent.start.offset: ast_node.extent.end.offset]
         name = []
         for ch in code_str:
             if ch in binary_operators:
@@ -192,7 +191,7 @@ def get_operator(ast_node):
         return [name.strip()]
 
 
-def add_reference(parent_id, ast_node, graph):
+def add_reference(parent_id, ast_node, tree):
     is_reserved = True
     name = "REFERENCE"
     if ast_node.kind in [CursorKind.DECL_REF_EXPR, CursorKind.MEMBER_REF_EXPR]:
@@ -205,35 +204,35 @@ def add_reference(parent_id, ast_node, graph):
         name = ast_node.spelling
         is_reserved = False
 
-    add_child(graph, parent_id, name, is_reserved)
+    add_child(tree, parent_id, name, is_reserved)
     # print("\tName : {0}".format(name))
 
 
-def add_literal(parent_id, ast_node, graph):
+def add_literal(parent_id, ast_node, tree):
     if ast_node.kind in [CursorKind.STRING_LITERAL,
                          CursorKind.CHARACTER_LITERAL]:
-        add_child(graph, parent_id, 'STRING_VALUE', is_reserved=True)
+        add_child(tree, parent_id, 'STRING_VALUE', is_reserved=True)
     else:
         token = next(ast_node.get_tokens(), None)
         if token:
             value = token.spelling
-            add_child(graph, parent_id, value)
+            add_child(tree, parent_id, value)
             # print("\tValue : {0}".format(value))
 
 
-def add_declaration(parent_id, ast_node, graph):
+def add_declaration(parent_id, ast_node, tree):
     is_func = False
     if is_function(ast_node):
         is_func = True
         return_type = ast_node.type.get_result().spelling
         if len(return_type) > 0:
-            return_type_node_id = add_intermediate_node(graph, parent_id, "RETURN_TYPE")
-            add_child(graph, return_type_node_id, return_type, is_reserved=False)
+            return_type_node_id = add_intermediate_node(tree, parent_id, "RETURN_TYPE")
+            add_child(tree, return_type_node_id, return_type, is_reserved=False)
     else:
         declaration_type = ast_node.type.spelling
         if len(declaration_type) > 0:
-            declaration_type_node_id = add_intermediate_node(graph, parent_id, "DECLARATION_TYPE")
-            add_child(graph, declaration_type_node_id, declaration_type, is_reserved=False)
+            declaration_type_node_id = add_intermediate_node(tree, parent_id, "DECLARATION_TYPE")
+            add_child(tree, declaration_type_node_id, declaration_type, is_reserved=False)
             # print("\tDecl type : {0}".format(declaration_type))
 
     if not is_template_parameter(ast_node):
@@ -250,9 +249,9 @@ def add_declaration(parent_id, ast_node, graph):
             name = ast_node.kind.name + "_UNNAMED"
             is_reserved = True
 
-        name_node_id = add_intermediate_node(graph, parent_id, "DECLARATION_NAME")
+        name_node_id = add_intermediate_node(tree, parent_id, "DECLARATION_NAME")
 
-        add_child(graph, name_node_id, name, is_reserved=is_reserved)
+        add_child(tree, name_node_id, name, is_reserved=is_reserved)
         # print("\tName : {0}".format(name))
 
 
@@ -264,20 +263,21 @@ def func_from_pointer(ast_node):
         return ast_node
 
 
-def ast_to_graph(ast_start_node, max_depth):
-    g = nx.Graph()
+def ast_to_graph(ast_start_node, max_depth, source_cache=None, directory=None):
+    tree = AstTree()
     stack = [(ast_start_node, 0)]
     parent_map = {ast_start_node.hash: None}
+    visited = set()
     while stack:
         ast_node, depth = stack.pop()
-        node_id = ast_node.hash
-        if not g.has_node(node_id):
-            parent_id = parent_map[node_id]
-            if add_node(ast_node, g):
-                if parent_id is not None:
-                    g.add_edge(parent_id, node_id)
-
-                if is_call_expr(ast_node):
+        node_hash = ast_node.hash
+        if node_hash not in visited:
+            parent_id = parent_map[node_hash]
+            node_id = add_node(ast_node, tree, parent_id, source_cache, directory)
+            is_call = is_call_expr(ast_node)
+            if node_id is not None:
+                visited.add(node_hash)
+                if is_call:
                     func_name = None
                     if ast_node.referenced:
                         func_name = ast_node.referenced.spelling
@@ -290,14 +290,14 @@ def ast_to_graph(ast_start_node, max_depth):
                         func_name = "FUNCTION_CALL"
                     func_name = re.sub(r'\s+|,+', '', func_name)
 
-                    call_expr_id = add_intermediate_node(g, node_id, func_name)
+                    call_expr_id = add_intermediate_node(tree, node_id, func_name)
                     node_id = call_expr_id
             else:
                 node_id = parent_id
 
             # Ignore too deep trees
             if max_depth == 0 or depth <= max_depth:
-                if is_call_expr(ast_node):
+                if is_call:
                     for arg_node in ast_node.get_arguments():
                         stack.append((arg_node, depth + 1))
                         parent_map[arg_node.hash] = node_id
@@ -305,4 +305,4 @@ def ast_to_graph(ast_start_node, max_depth):
                     for child_node in ast_node.get_children():
                         stack.append((child_node, depth + 1))
                         parent_map[child_node.hash] = node_id
-    return g
+    return tree
@@ -0,0 +1,141 @@
+import re
+from .shards import open_shard
+
+MAGIC = b'C2B\x01'
+STRING_RECORD = 1
+SAMPLE_RECORD = 2
+# one varint: bytes with the continuation bit followed by the last byte
+VARINT = re.compile(b'[\\x80-\\xff]*[\\x00-\\x7f]')
+
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(buffer, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class ShardWriter:
+    # writes samples as length-prefixed records, strings are interned per shard: each new token or path
+    # is written once as a string record and referenced by its varint id from following sample records
+    def __init__(self, file):
+        self.file = file
+        self.file.write(MAGIC)
+        self.strings = {}
+        self.bytes_num = len(MAGIC)
+
+    def write(self, sample):
+        record = bytearray()
+        record.append(SAMPLE_RECORD)
+        write_varint(record, self.__string_id(sample.source_mark[0]))
+        write_varint(record, sample.source_mark[1])
+        write_varint(record, self.__string_id('|'.join(sample.key)))
+        # the record ends with (start token, path, end token) ids of contexts
+        for context in sample.contexts:
+            write_varint(record, self.__string_id('|'.join(context.start_token)))
+            write_varint(record, self.__string_id('|'.join(context.path.tokens)))
+            write_varint(record, self.__string_id('|'.join(context.end_token)))
+        self.__write_record(record)
+
+    def __string_id(self, value):
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings[value] = string_id
+            record = bytearray()
+            record.append(STRING_RECORD)
+            record += value.encode('utf-8')
+            self.__write_record(record)
+        return string_id
+
+    def __write_record(self, record):
+        length = bytearray()
+        write_varint(length, len(record))
+        self.file.write(length)
+        self.file.write(record)
+        self.bytes_num += len(length) + len(record)
+
+
+def read_records(file, chunk_size=1 << 20):
+    # yields payloads of length-prefixed records reading the file by chunks,
+    # the truncated last record of an interrupted writer is ignored
+    buffer = b''
+    pos = 0
+    while True:
+        buffer_size = len(buffer)
+        # records are decoded while their length and payload are fully in the buffer
+        while pos < buffer_size:
+            length = buffer[pos]
+            if length < 0x80:
+                start = pos + 1
+            else:
+                try:
+                    length, start = read_varint(buffer, pos)
+                except IndexError:
+                    break  # the length itself isn't complete
+            if start + length > buffer_size:
+                break
+            pos = start + length
+            yield buffer[start:pos]
+        try:
+            chunk = file.read(chunk_size)
+        except EOFError:
+            return  # truncated compressed stream
+        if not chunk:
+            return
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+class StringTable(dict):
+    # maps encoded varint ids to strings, ids are decoded only once per shard
+    def __init__(self):
+        dict.__init__(self)
+        self.strings = []
+
+    def __missing__(self, encoded_id):
+        value = self.strings[read_varint(encoded_id, 0)[0]]
+        self[encoded_id] = value
+        return value
+
+
+def read_shard(file_name):
+    # yields samples as tuples (file name, line, key, contexts), contexts are tuples of start token, path
+    # and end token; the key, tokens and paths are strings with sub-tokens delimited by "|"
+    strings = StringTable()
+    with open_shard(file_name) as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a binary shard file: ' + file_name)
+        for record in read_records(file):
+            if record[0] == STRING_RECORD:
+                strings.strings.append(record[1:].decode('utf-8'))
+                continue
+            file_id, pos = read_varint(record, 1)
+            line, pos = read_varint(record, pos)
+            # all other fields are string ids, they are split and mapped to strings in bulk
+            values = list(map(strings.__getitem__, VARINT.findall(record, pos)))
+            contexts = list(zip(values[1::3], values[2::3], values[3::3]))
+            yield strings.strings[file_id], line, values[0], contexts
+
+
+def sample_text(key, contexts):
+    # the sample line of the text format without the source mark
+    return ' '.join([key] + [start_token + ',' + path + ',' + end_token for start_token, path, end_token in contexts])
+
+
+def convert_to_text(file_name, text_file_name):
+    with open(text_file_name, 'w') as file:
+        for source_file, line, key, contexts in read_shard(file_name):
+            file.write(str((source_file, line)) + sample_text(key, contexts) + '\n')
@@ -1,11 +1,23 @@
 class Context:
+    # contexts are compared by value, so equal contexts of a function are stored once
+    __slots__ = ('start_token', 'end_token', 'path')
+
     def __init__(self, start_token, end_token, path, validate=False):
-        self.start_token = start_token
-        self.end_token = end_token
+        self.start_token = tuple(start_token)
+        self.end_token = tuple(end_token)
         self.path = path
         if validate:
             self.__validate()
 
+    def __eq__(self, other):
+        if not isinstance(other, Context):
+            return NotImplemented
+        return (self.start_token == other.start_token and self.end_token == other.end_token and
+                self.path == other.path)
+
+    def __hash__(self):
+        return hash((self.start_token, self.end_token, self.path.tokens))
+
     def __validate(self):
         self.__validate_token(self.start_token)
         self.__validate_token(self.end_token)
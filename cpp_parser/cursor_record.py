@@ -0,0 +1,140 @@
+class CallCounter:
+    # numbers of libclang calls made by cursor records of a translation unit and of calls answered from their cache
+    def __init__(self):
+        self.calls = 0
+        self.cached_calls = 0
+
+
+class CursorRecord:
+    # wraps a libclang cursor with the same interface, each property is fetched from libclang once
+    # and children cursors are visited once, so the traversal doesn't repeat ctypes round-trips
+    __slots__ = ('cursor', 'counter', '_kind', '_hash', '_spelling', '_displayname', '_extent', '_location', '_type',
+                 '_referenced', '_is_definition', '_children', '_arguments')
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+        self._kind = None
+        self._hash = None
+        self._spelling = None
+        self._displayname = None
+        self._extent = None
+        self._location = None
+        self._type = None
+        self._referenced = self
+        self._is_definition = None
+        self._children = None
+        self._arguments = None
+
+    @property
+    def kind(self):
+        # not cached if libclang fails to map the kind, so the error is raised on each access as by the cursor
+        if self._kind is None:
+            self._kind = self.__fetch('kind')
+        else:
+            self.counter.cached_calls += 1
+        return self._kind
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = self.__fetch('hash')
+        else:
+            self.counter.cached_calls += 1
+        return self._hash
+
+    @property
+    def spelling(self):
+        if self._spelling is None:
+            self._spelling = self.__fetch('spelling')
+        else:
+            self.counter.cached_calls += 1
+        return self._spelling
+
+    @property
+    def displayname(self):
+        if self._displayname is None:
+            self._displayname = self.__fetch('displayname')
+        else:
+            self.counter.cached_calls += 1
+        return self._displayname
+
+    @property
+    def extent(self):
+        if self._extent is None:
+            self._extent = self.__fetch('extent')
+        else:
+            self.counter.cached_calls += 1
+        return self._extent
+
+    @property
+    def location(self):
+        if self._location is None:
+            self._location = self.__fetch('location')
+        else:
+            self.counter.cached_calls += 1
+        return self._location
+
+    @property
+    def type(self):
+        if self._type is None:
+            self._type = self.__fetch('type')
+        else:
+            self.counter.cached_calls += 1
+        return self._type
+
+    @property
+    def referenced(self):
+        # the record itself marks the not fetched value because the referenced cursor can be None
+        if self._referenced is self:
+            referenced = self.__fetch('referenced')
+            self._referenced = CursorRecord(referenced, self.counter) if referenced is not None else None
+        else:
+            self.counter.cached_calls += 1
+        return self._referenced
+
+    def is_definition(self):
+        if self._is_definition is None:
+            self.counter.calls += 1
+            self._is_definition = self.cursor.is_definition()
+        else:
+            self.counter.cached_calls += 1
+        return self._is_definition
+
+    def get_children(self):
+        if self._children is None:
+            children = list(self.cursor.get_children())
+            # the visitor calls back into Python for each child
+            self.counter.calls += 1 + len(children)
+            self._children = [CursorRecord(child, self.counter) for child in children]
+        else:
+            self.counter.cached_calls += 1
+        return iter(self._children)
+
+    def get_arguments(self):
+        if self._arguments is None:
+            arguments = list(self.cursor.get_arguments())
+            self.counter.calls += 1 + len(arguments)
+            self._arguments = [CursorRecord(argument, self.counter) for argument in arguments]
+        else:
+            self.counter.cached_calls += 1
+        return iter(self._arguments)
+
+    def get_tokens(self):
+        self.counter.calls += 1
+        return self.cursor.get_tokens()
+
+    def release(self):
+        # drops cached children, so records of the subtree can be freed
+        self._children = None
+        self._arguments = None
+
+    def __getattr__(self, name):
+        # other properties and methods of the cursor aren't cached, each access is a libclang call
+        if name in CursorRecord.__slots__:
+            raise AttributeError(name)
+        return self.__fetch(name)
+
+    def __fetch(self, name):
+        self.counter.calls += 1
+        return getattr(self.cursor, name)
@@ -0,0 +1,53 @@
+import heapq
+import resource
+
+
+def current_rss():
+    # resident set size of the process in bytes
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class FileMetrics:
+    def __init__(self, file_path, slowest_functions_num=5):
+        self.file_path = file_path
+        self.parse_time = 0.0
+        self.traversal_time = 0.0
+        self.graph_time = 0.0
+        self.paths_time = 0.0
+        self.save_time = 0.0
+        self.functions_num = 0
+        self.contexts_num = 0
+        self.libclang_calls = 0
+        self.libclang_cached_calls = 0
+        self.slowest_functions_num = slowest_functions_num
+        self.slowest_functions = []
+
+    def add_function(self, source_mark, name, seconds):
+        # header functions are parsed with the translation unit, so the file of the function is kept
+        item = (seconds, source_mark[0], source_mark[1], name)
+        if len(self.slowest_functions) < self.slowest_functions_num:
+            heapq.heappush(self.slowest_functions, item)
+        else:
+            heapq.heappushpop(self.slowest_functions, item)
+
+    def to_dict(self):
+        return {'file': self.file_path,
+                'parse_time': self.parse_time,
+                'traversal_time': self.traversal_time,
+                'graph_time': self.graph_time,
+                'paths_time': self.paths_time,
+                'save_time': self.save_time,
+                'total_time': self.parse_time + self.traversal_time + self.graph_time + self.paths_time +
+                              self.save_time,
+                'functions_num': self.functions_num,
+                'contexts_num': self.contexts_num,
+                'libclang_calls': self.libclang_calls,
+                'libclang_cached_calls': self.libclang_cached_calls,
+                'rss': current_rss(),
+                'slowest_functions': [{'function': name, 'file': file_path, 'line': line, 'time': seconds}
+                                      for seconds, file_path, line, name in sorted(self.slowest_functions,
+                                                                                   reverse=True)]}
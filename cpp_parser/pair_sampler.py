@@ -0,0 +1,25 @@
+import math
+import random
+
+
+def index_to_pair(index):
+    # pairs (i, j), i < j are numbered column by column: (0, 1), (0, 2), (1, 2), (0, 3), ...
+    j = (1 + math.isqrt(1 + 8 * index)) // 2
+    return index - j * (j - 1) // 2, j
+
+
+def sample_pairs(nodes_num, budget, rng=random):
+    # yields distinct random pairs of node indices without materializing all combinations,
+    # at most budget pairs are drawn
+    pairs_num = nodes_num * (nodes_num - 1) // 2
+    if pairs_num <= budget:
+        for index in rng.sample(range(pairs_num), pairs_num):
+            yield index_to_pair(index)
+        return
+    seen = set()
+    for _ in range(budget):
+        index = rng.randrange(pairs_num)
+        if index in seen:
+            continue  # repeated draws are counted by the budget too
+        seen.add(index)
+        yield index_to_pair(index)
@@ -2,11 +2,21 @@ from .context import Context
 
 
 class Path:
+    __slots__ = ('tokens',)
+
     def __init__(self, tokens, validate=False):
-        self.tokens = tokens
+        self.tokens = tuple(tokens)
         if validate:
             self.__validate()
 
+    def __eq__(self, other):
+        if not isinstance(other, Path):
+            return NotImplemented
+        return self.tokens == other.tokens
+
+    def __hash__(self):
+        return hash(self.tokens)
+
     def __validate(self):
         for sub_token in self.tokens:
             assert len(sub_token) > 0, "Invalid sub-token in the path: {0}".format(self.tokens)
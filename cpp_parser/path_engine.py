@@ -0,0 +1,52 @@
+from networkx.algorithms import shortest_path
+from networkx.exception import NetworkXNoPath
+
+
+class NetworkxPathEngine:
+    def __init__(self, tree):
+        self.graph = tree.to_networkx()
+
+    def path(self, start, end):
+        try:
+            return shortest_path(self.graph, start, end)
+        except NetworkXNoPath:
+            return None
+
+
+class TreePathEngine:
+    # the path between two AST nodes goes through their lowest common ancestor,
+    # so it can be found by walking parent pointers from the deeper node
+    def __init__(self, tree):
+        self.parents = tree.parents
+        self.depths = tree.depths
+
+    def path(self, start, end):
+        parents = self.parents
+        start_depth = self.depths[start]
+        end_depth = self.depths[end]
+        up = []
+        down = []
+        while start_depth > end_depth:
+            up.append(start)
+            start = parents[start]
+            start_depth -= 1
+        while end_depth > start_depth:
+            down.append(end)
+            end = parents[end]
+            end_depth -= 1
+        while start != end:
+            up.append(start)
+            down.append(end)
+            start = parents[start]
+            end = parents[end]
+            if start < 0:
+                return None  # nodes belong to different trees
+        up.append(start)
+        up.extend(reversed(down))
+        return up
+
+
+path_engines = {
+    'tree': TreePathEngine,
+    'networkx': NetworkxPathEngine
+}
@@ -0,0 +1,182 @@
+from clang.cindex import Diagnostic, TranslationUnit
+import hashlib
+import os
+import re
+import uuid
+
+
+def working_directory(compiler_args):
+    # relative paths of includes are resolved against the working directory of the compilation command
+    for arg in compiler_args:
+        if arg.startswith('-working-directory='):
+            return arg[len('-working-directory='):]
+    return os.getcwd()
+
+
+# leading lines of a source file which can be replaced by the precompiled header
+INCLUDE_LINE = re.compile(r'^\s*#\s*include\s*(<[^>]+>|"[^"]+")\s*(//.*)?$')
+
+
+def include_prefix(file_path):
+    # #include directives at the start of the file before any other code, blank lines and comments are skipped;
+    # other directives end the prefix because they can change the meaning of the following headers
+    includes = []
+    in_comment = False
+    with open(file_path, 'r', errors='replace') as file:
+        for line in file:
+            line = line.strip()
+            if in_comment:
+                if '*/' not in line:
+                    continue
+                in_comment = False
+                line = line[line.index('*/') + 2:].strip()
+            if not line or line.startswith('//'):
+                continue
+            if line.startswith('/*'):
+                if '*/' not in line:
+                    in_comment = True
+                    continue
+                line = line[line.index('*/') + 2:].strip()
+                if not line:
+                    continue
+            match = INCLUDE_LINE.match(line)
+            if match is None:
+                break
+            includes.append(match.group(1))
+    return includes
+
+
+class PchCache:
+    # precompiled headers built from the #include directives at the start of files, files with the same
+    # compilation arguments and the same include prefix share the PCH, so the PCH contains exactly the headers
+    # the file includes first; files without the prefix or with a PCH which doesn't work are parsed as is.
+    # Files are shared between processes and the least recently used ones are removed above the size limit
+    def __init__(self, cache_path, max_bytes=8 * 1024 * 1024 * 1024):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.failed_keys = set()
+        self.built_keys = set()
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(self.cache_path):
+            os.makedirs(self.cache_path, exist_ok=True)
+
+    def parse(self, index, compiler_args, file_path):
+        try:
+            includes = include_prefix(file_path)
+        except OSError:
+            includes = []
+        if not includes:
+            self.misses += 1
+            return index.parse(file_path, compiler_args)
+
+        key = self.__make_key(compiler_args, file_path, includes)
+        pch_file = os.path.join(self.cache_path, key + '.pch')
+        if key not in self.failed_keys and os.path.exists(pch_file):
+            tu = None
+            try:
+                os.utime(pch_file)
+                tu = index.parse(file_path, compiler_args + ['-include-pch', pch_file])
+            except Exception:
+                pass
+            if tu is not None and not self.__has_errors(tu, Diagnostic.Fatal):
+                # headers without include guards are included again by the file, errors mean
+                # the result can differ from the parsing without the PCH, so the file is parsed as is
+                if not self.__has_errors(tu, Diagnostic.Error):
+                    self.hits += 1
+                    return tu
+            else:
+                # the PCH is out of date or incompatible with the file, it's rebuilt only once per process
+                self.__remove(pch_file)
+                if key in self.built_keys:
+                    self.failed_keys.add(key)
+
+        self.misses += 1
+        tu = index.parse(file_path, compiler_args)
+        if key not in self.failed_keys and not os.path.exists(pch_file) and not self.__has_errors(tu, Diagnostic.Error):
+            self.built_keys.add(key)
+            self.__build(index, tu, compiler_args, file_path, key, pch_file, len(includes))
+        return tu
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def __build(self, index, tu, compiler_args, file_path, key, pch_file, includes_num):
+        header_file = self.__make_header(tu, compiler_args, key, includes_num)
+        if header_file is None:
+            self.failed_keys.add(key)
+            return
+        # temporary names are unique per process because other processes can build the same PCH
+        tmp_file = '{0}.{1}.tmp'.format(pch_file, uuid.uuid4().hex)
+        try:
+            language = 'c-header' if file_path.endswith('.c') else 'c++-header'
+            pch_tu = index.parse(header_file, compiler_args + ['-x', language], options=TranslationUnit.PARSE_INCOMPLETE)
+            if self.__has_errors(pch_tu, Diagnostic.Error):
+                self.failed_keys.add(key)
+                return
+            pch_tu.save(tmp_file)
+            os.replace(tmp_file, pch_file)
+        except Exception:
+            self.failed_keys.add(key)
+        finally:
+            self.__remove(tmp_file)
+        self.__evict()
+
+    def __make_header(self, tu, compiler_args, key, includes_num):
+        # the PCH refers to the header it was built from, so the header is kept in the cache;
+        # the prefix directives are the first includes of the file, they are written with resolved paths
+        header_file = os.path.join(self.cache_path, key + '.h')
+        if os.path.exists(header_file):
+            return header_file
+        headers = [include.include.name for include in tu.get_includes() if include.depth == 1][:includes_num]
+        if len(headers) != includes_num:
+            return None
+        directory = working_directory(compiler_args)
+        tmp_file = '{0}.{1}.tmp'.format(header_file, uuid.uuid4().hex)
+        with open(tmp_file, 'w') as file:
+            for header in headers:
+                file.write('#include "{0}"\n'.format(os.path.join(directory, header)))
+        try:
+            os.link(tmp_file, header_file)
+        except FileExistsError:
+            pass  # created by another process
+        finally:
+            self.__remove(tmp_file)
+        return header_file
+
+    def __evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_path):
+            if entry.name.endswith('.pch'):
+                try:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except FileNotFoundError:
+                    pass  # removed by another process
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self.__remove(path)
+            self.__remove(path[:-len('.pch')] + '.h')
+            total_size -= size
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # removed by another process
+
+    @staticmethod
+    def __has_errors(tu, severity):
+        return any(diagnostic.severity >= severity for diagnostic in tu.diagnostics)
+
+    @staticmethod
+    def __make_key(compiler_args, file_path, includes):
+        language = 'c' if file_path.endswith('.c') else 'c++'
+        items = [language] + list(compiler_args) + includes
+        # quoted includes are searched in the directory of the file first
+        if any(include.startswith('"') for include in includes):
+            items.append(os.path.dirname(os.path.abspath(file_path)))
+        return hashlib.sha1('\0'.join(items).encode('utf-8')).hexdigest()
@@ -2,17 +2,15 @@ from .context import Context
 
 
 def make_str_key(list_value):
-    str_value = ""
-    for item in list_value:
-        str_value += str(item)
-        str_value += "|"
-    str_value = str_value[:-1]
-    return str_value
+    return '|'.join(map(str, list_value))
 
 
 class Sample:
+    # samples are compared by identity, different functions can have the same source mark and key
+    __slots__ = ('key', 'contexts', 'source_mark')
+
     def __init__(self, key, contexts, source_mark, validate=False):
-        self.key = key
+        self.key = tuple(key)
         self.contexts = contexts
         self.source_mark = source_mark
         if validate:
@@ -25,9 +23,9 @@ class Sample:
             Context.validate_sub_token(sub_token)
 
     def __str__(self):
-        str_value = make_str_key(self.key)
+        # the line is built with a single join
+        parts = ['|'.join(self.key)]
         for context in self.contexts:
-            str_value += " " + make_str_key(context.start_token)
-            str_value += "," + make_str_key(context.path.tokens)
-            str_value += "," + make_str_key(context.end_token)
-        return str_value
+            parts.append('|'.join(context.start_token) + ',' + '|'.join(context.path.tokens) + ',' +
+                         '|'.join(context.end_token))
+        return ' '.join(parts)
@@ -0,0 +1,183 @@
+import gzip
+import json
+import lzma
+import os
+import queue
+import threading
+import uuid
+
+compressions = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open)
+}
+
+# compressed streams which can't be flushed to a readable state without ending them
+unflushable_compressions = ['lzma']
+
+# the queue item which makes the writer thread flush the file
+FLUSH = 'flush'
+
+# all kinds of raw samples files readers should handle
+shard_patterns = ['*.c2s', '*.c2s.gz', '*.c2s.xz', '*.c2b', '*.c2b.gz', '*.c2b.xz']
+
+
+def open_shard(file_name, mode='rb'):
+    for extension, open_file in compressions.values():
+        if file_name.endswith(extension):
+            return open_file(file_name, mode)
+    return open(file_name, mode)
+
+
+def shard_index_name(file_name):
+    return file_name + '.idx'
+
+
+class RollingShardWriter:
+    # keeps one large raw samples file open and starts a new one when the current file exceeds the size
+    # or the samples number; each file is completed when it's rotated, its compressed stream is ended and
+    # the .idx file with its samples number is written next to it, so a killed process loses only the open file
+    def __init__(self, out_path, shard_format='text', compression=None, max_bytes=256 * 1024 * 1024,
+                 max_samples=0):
+        self.out_path = out_path
+        self.shard_format = shard_format
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_samples = max_samples
+        self.file_name = None
+        self.file = None
+        self.binary_writer = None
+        self.samples_num = 0
+        self.bytes_num = 0
+        # callbacks waiting until the samples written before them can be read from the files
+        self.flushed_callbacks = []
+
+    def write(self, samples):
+        for sample in samples:
+            if self.file is None:
+                self.__open()
+            if self.binary_writer is not None:
+                self.binary_writer.write(sample)
+                self.bytes_num = self.binary_writer.bytes_num
+            else:
+                line = (str(sample.source_mark) + str(sample) + '\n').encode('utf-8')
+                self.file.write(line)
+                self.bytes_num += len(line)
+            self.samples_num += 1
+            if (self.max_bytes and self.bytes_num >= self.max_bytes or
+                    self.max_samples and self.samples_num >= self.max_samples):
+                self.__rotate()
+
+    def flush(self, on_flushed=None, complete=True, wait=True):
+        # written samples aren't lost if the process is killed, an lzma stream is readable only when it's ended,
+        # so the file is completed and the next samples go to a new one, or without complete on_flushed waits
+        # until the file is rotated; samples are written synchronously, wait is there for BackgroundWriter
+        if on_flushed is not None:
+            self.flushed_callbacks.append(on_flushed)
+        if self.file is not None and self.compression in unflushable_compressions:
+            if complete:
+                self.__rotate()
+            return
+        if self.file is not None:
+            self.file.flush()
+        self.__call_flushed()
+
+    def close(self):
+        self.__rotate()
+
+    def __rotate(self):
+        if self.file is None:
+            return
+        # the compressed stream is ended before the index is written, so an indexed file is complete
+        self.file.close()
+        index_name = shard_index_name(self.file_name)
+        with open(index_name + '.tmp', 'w') as file:
+            json.dump({'samples': self.samples_num, 'bytes': self.bytes_num, 'format': self.shard_format,
+                       'compression': self.compression}, file)
+        os.replace(index_name + '.tmp', index_name)
+        self.file = None
+        self.binary_writer = None
+        self.__call_flushed()
+
+    def __call_flushed(self):
+        callbacks = self.flushed_callbacks
+        self.flushed_callbacks = []
+        for on_flushed in callbacks:
+            on_flushed()
+
+    def __open(self):
+        # imported here because the binary format module uses open_shard
+        from .binary_shard import ShardWriter
+        extension = '.c2b' if self.shard_format == 'binary' else '.c2s'
+        if self.compression:
+            compression_extension, open_file = compressions[self.compression]
+            extension += compression_extension
+        else:
+            open_file = open
+        self.file_name = os.path.join(self.out_path, uuid.uuid4().hex + extension)
+        self.file = open_file(self.file_name, 'wb')
+        if self.shard_format == 'binary':
+            self.binary_writer = ShardWriter(self.file)
+        self.samples_num = 0
+        self.bytes_num = 0
+
+
+class BackgroundWriter:
+    # serializes and writes batches of samples in a separate thread while the parser goes on with the next files,
+    # the bounded queue blocks the parser when the writer falls behind
+    def __init__(self, writer, queue_size=4):
+        self.writer = writer
+        self.queue = queue.Queue(queue_size)
+        self.thread = None
+        self.error = None
+
+    def write(self, samples):
+        self.__check_error()
+        if self.thread is None:
+            # the thread is started lazily in the parser process, threads don't survive fork
+            self.thread = threading.Thread(target=self.__run, daemon=True)
+            self.thread.start()
+        self.queue.put(samples)
+
+    def flush(self, on_flushed=None, complete=True, wait=True):
+        # waits until all handed off samples are written to the file, without waiting on_flushed
+        # is called by the writer thread when they are written
+        self.__check_error()
+        if self.thread is None:
+            self.writer.flush(on_flushed, complete)
+            return
+        self.queue.put((FLUSH, on_flushed, complete))
+        if wait:
+            self.queue.join()
+            self.__check_error()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.writer.close()
+        self.__check_error()
+
+    def __run(self):
+        while True:
+            samples = self.queue.get()
+            try:
+                if samples is None:
+                    return
+                if isinstance(samples, tuple) and samples[0] is FLUSH:
+                    # samples are lost after an error, so they aren't reported as written
+                    if self.error is None:
+                        self.writer.flush(samples[1], samples[2])
+                elif self.error is None:
+                    self.writer.write(samples)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def __check_error(self):
+        # errors of the writer thread are raised in the parser
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
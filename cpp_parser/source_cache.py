@@ -0,0 +1,60 @@
+from collections import OrderedDict
+import mmap
+
+
+class SourceCache:
+    # keeps contents of recently used source files, the least recently used files are evicted
+    # when the cache exceeds the files number or the total size limits
+    def __init__(self, max_files=64, max_bytes=256 * 1024 * 1024, use_mmap=False):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        self.files = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __del__(self):
+        self.clear()
+
+    def get(self, file_name):
+        contents = self.files.get(file_name)
+        if contents is not None:
+            self.hits += 1
+            self.files.move_to_end(file_name)
+            return contents
+
+        self.misses += 1
+        contents = self.__load(file_name)
+        self.files[file_name] = contents
+        self.size += len(contents)
+        while len(self.files) > 1 and (len(self.files) > self.max_files or self.size > self.max_bytes):
+            _, evicted = self.files.popitem(last=False)
+            self.__release(evicted)
+        return contents
+
+    def get_text(self, file_name, start_offset, end_offset):
+        contents = self.get(file_name)
+        return contents[start_offset:end_offset].decode('utf-8', errors='replace')
+
+    def clear(self):
+        for contents in self.files.values():
+            self.__release(contents)
+        self.files.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'files': len(self.files), 'bytes': self.size}
+
+    def __load(self, file_name):
+        with open(file_name, 'rb') as fh:
+            if self.use_mmap:
+                try:
+                    return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    pass  # empty files can't be mapped
+            return fh.read()
+
+    def __release(self, contents):
+        self.size -= len(contents)
+        if isinstance(contents, mmap.mmap):
+            contents.close()
@@ -0,0 +1,42 @@
+import argparse
+import os
+from pathlib import Path
+from tqdm import tqdm
+from cpp_parser.binary_shard import convert_to_text
+from cpp_parser.shards import shard_index_name
+
+
+def main():
+    args_parser = argparse.ArgumentParser(
+        description='converts binary raw samples files (.c2b) produced by cppminer to the text format (.c2s)')
+
+    args_parser.add_argument('Path',
+                             metavar='path',
+                             type=str,
+                             help='the binary file or the directory with binary files')
+
+    args_parser.add_argument('-r', '--remove',
+                             action='store_true',
+                             help='remove binary files after the conversion',
+                             required=False)
+
+    args = args_parser.parse_args()
+
+    if os.path.isfile(args.Path):
+        file_paths = [args.Path]
+    else:
+        file_paths = [file_path.as_posix() for pattern in ('*.c2b', '*.c2b.gz', '*.c2b.xz')
+                      for file_path in Path(args.Path).rglob(pattern)]
+
+    for file_path in tqdm(file_paths):
+        text_file_path = file_path[:file_path.rindex('.c2b')] + '.c2s'
+        convert_to_text(file_path, text_file_path + '.tmp')
+        os.replace(text_file_path + '.tmp', text_file_path)
+        if args.remove:
+            os.remove(file_path)
+            if os.path.exists(shard_index_name(file_path)):
+                os.remove(shard_index_name(file_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,224 @@
+from array import array
+from ast import literal_eval
 from pathlib import Path
-from bitarray import bitarray
 from tqdm import tqdm
 import lmdb
+import multiprocessing
 import os
 import random
+import struct
+from dedup_index import DedupIndex, mark_hash
+from manifest import manifest_shards
+from cpp_parser.binary_shard import read_shard, sample_text
+from cpp_parser.shards import open_shard, shard_patterns, shard_index_name
+
+
+def make_key(sample_id):
+    # big-endian fixed width keys keep LMDB order equal to the numeric order of samples
+    return struct.pack('>Q', sample_id)
+
+
+def read_samples(file_path):
+    # parse a raw samples file dropping samples with repeated source marks,
+    # samples are tuples of the source mark, its hash, the source file name and the sample line
+    if '.c2b' in os.path.basename(file_path):
+        return read_binary_samples(file_path)
+    marks = set()
+    samples = []
+    with open_shard(file_path, 'rt') as file:
+        # print('Loading file: ' + file_path)
+        for line in read_lines(file):
+            src_mark_str, _, sample_line = line.partition(')')
+            src_mark = src_mark_str[2:]
+            if src_mark not in marks:
+                marks.add(src_mark)
+                source_file = literal_eval(src_mark_str + ')')[0]
+                samples.append((src_mark, mark_hash(src_mark), source_file, sample_line))
+    return file_path, samples
+
+
+def read_lines(file):
+    # the last line of a file written by an interrupted process can be truncated
+    try:
+        for line in file:
+            if not line.endswith('\n'):
+                return
+            yield line
+    except EOFError:
+        return  # truncated compressed stream
+
+
+def read_binary_samples(file_path):
+    # source marks are stored as fields, they are formatted as marks of the text format
+    # so samples of both formats are deduplicated together
+    marks = set()
+    samples = []
+    for source_file, line, key, contexts in read_shard(file_path):
+        src_mark = str((source_file, line))[2:-1]
+        if src_mark not in marks:
+            marks.add(src_mark)
+            samples.append((src_mark, mark_hash(src_mark), source_file, sample_text(key, contexts) + '\n'))
+    return file_path, samples
+
+
+def read_files(file_paths, pool, window_size):
+    if pool is None:
+        for file_path in file_paths:
+            yield read_samples(file_path)
+    else:
+        # files are handed to the pool by windows to limit the number of parsed files waiting in memory
+        for start in range(0, len(file_paths), window_size):
+            yield from pool.imap(read_samples, file_paths[start:start + window_size])
+
+
+def print_dedup_stats(dedup_index):
+    stats = dedup_index.stats()
+    print('Deduplication samples: {0} duplicates: {1} exact checks: {2} false positives: {3}'.format(
+        stats['marks'], stats['duplicates'], stats['exact_checks'], stats['false_positives']))
 
 
 class DataSetMerge:
-    def __init__(self, output_path, map_size):
+    def __init__(self, output_path, map_size, dedup_memory_size=256 * 1024 * 1024):
         self.output_path = output_path
         self.train_set_file = os.path.join(self.output_path, "dataset.train.c2s")
         self.test_set_file = os.path.join(self.output_path, "dataset.test.c2s")
         self.validation_set_file = os.path.join(self.output_path, "dataset.val.c2s")
-        self.samples_db = lmdb.open(os.path.join(self.output_path, 'samples.db'), writemap=True)
-        self.samples_db.set_mapsize(map_size)
+        self.dedup_memory_size = dedup_memory_size
+        # samples files of incremental runs are kept, the next run skips translation units by them
+        self.kept_files = manifest_shards(self.output_path)
         self.total_num = 0
+        self.samples_db = lmdb.open(os.path.join(self.output_path, 'samples.db'), writemap=True, max_dbs=2)
+        self.samples_db.set_mapsize(map_size)
+        self.samples_table = self.samples_db.open_db(b'samples')
+        self.marks_table = self.samples_db.open_db(b'marks')
+
+    def resource_files(self):
+        dataset_files = [self.train_set_file, self.test_set_file, self.validation_set_file]
+        return [file_path.as_posix() for pattern in shard_patterns
+                for file_path in Path(self.output_path).rglob(pattern)
+                if file_path.as_posix() not in dataset_files]
 
-    def merge(self, clear_resources=True):
-        functions = set()
+    def remove_resource(self, file_path):
+        if file_path in self.kept_files:
+            return
+        os.remove(file_path)
+        if os.path.exists(shard_index_name(file_path)):
+            os.remove(shard_index_name(file_path))
+
+    def merge(self, clear_resources=True, jobs=1, commit_size=100000):
+        functions = DedupIndex(self.marks_table, self.dedup_memory_size)
         sample_id = 0
         self.total_num = 0
+        file_paths = self.resource_files()
+        with self.samples_db.begin(write=True) as txn:
+            txn.drop(self.samples_table, delete=False)
+            txn.drop(self.marks_table, delete=False)
+        pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+        txn = self.samples_db.begin(write=True)
+        try:
+            with tqdm(total=len(file_paths)) as pbar:
+                for file_path, samples in read_files(file_paths, pool, jobs * 4):
+                    for src_mark, src_mark_hash, _, sample_line in samples:
+                        if functions.add(txn, src_mark, src_mark_hash):
+                            txn.put(make_key(sample_id), sample_line.encode('ascii'), db=self.samples_table)
+                            sample_id += 1
+                            if sample_id % commit_size == 0:
+                                txn.commit()
+                                txn = self.samples_db.begin(write=True)
+                    if clear_resources:
+                        self.remove_resource(file_path)
+                    pbar.update(1)
+            txn.commit()
+        except BaseException:
+            txn.abort()
+            raise
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.total_num = sample_id - 1
+        print_dedup_stats(functions)
+
+    def split(self, clear_resources=True, jobs=1, train_set_ratio=0.7, split_by='sample', buffer_size=1 << 20,
+              commit_size=100000):
+        # single pass over resource files, each sample goes to the dataset defined by the stable hash of
+        # its source mark or source file name, so the split is reproducible without shuffling;
+        # only source marks are kept in the database for the deduplication
+        functions = DedupIndex(self.marks_table, self.dedup_memory_size)
+        self.total_num = 0
+        test_bound = train_set_ratio + (1.0 - train_set_ratio) / 2
+        file_paths = self.resource_files()
         with self.samples_db.begin(write=True) as txn:
-            files_num = sum(1 for _ in Path(self.output_path).rglob('*.c2s'))
-            with tqdm(total=files_num) as pbar:
-                for file_path in Path(self.output_path).rglob('*.c2s'):
-                    with file_path.open() as file:
-                        # print('Loading file: ' + file_path.absolute().as_posix())
-                        for line in file.readlines():
-                            src_mark_str, _, sample_line = line.partition(')')
-                            src_mark = src_mark_str[2:]
-                            if src_mark not in functions:
-                                txn.put(str(sample_id).encode('ascii'), sample_line.encode('ascii'))
-                                sample_id += 1
-                                functions.add(src_mark)
+            txn.drop(self.marks_table, delete=False)
+        pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+        txn = self.samples_db.begin(write=True)
+        train_file = open(self.train_set_file, 'wb', buffering=buffer_size)
+        test_file = open(self.test_set_file, 'wb', buffering=buffer_size)
+        validation_file = open(self.validation_set_file, 'wb', buffering=buffer_size)
+        try:
+            with tqdm(total=len(file_paths)) as pbar:
+                for file_path, samples in read_files(file_paths, pool, jobs * 4):
+                    for src_mark, src_mark_hash, source_file, sample_line in samples:
+                        if not functions.add(txn, src_mark, src_mark_hash):
+                            continue
+                        if split_by == 'file':
+                            split_hash = mark_hash(source_file)
+                        else:
+                            split_hash = src_mark_hash
+                        position = split_hash / float(1 << 64)
+                        if position < train_set_ratio:
+                            train_file.write(sample_line.encode('ascii'))
+                        elif position < test_bound:
+                            test_file.write(sample_line.encode('ascii'))
+                        else:
+                            validation_file.write(sample_line.encode('ascii'))
+                        self.total_num += 1
+                        if self.total_num % commit_size == 0:
+                            txn.commit()
+                            txn = self.samples_db.begin(write=True)
                     if clear_resources:
-                        os.remove(file_path.absolute().as_posix())
+                        self.remove_resource(file_path)
                     pbar.update(1)
-            self.total_num = sample_id - 1
+            txn.commit()
+        except BaseException:
+            txn.abort()
+            raise
+        finally:
+            print("Closing files ...")
+            train_file.close()
+            test_file.close()
+            validation_file.close()
+            if pool is not None:
+                pool.close()
+                pool.join()
+        print_dedup_stats(functions)
 
-    def dump_datasets(self, train_set_ratio=0.7):
+    def dump_datasets(self, train_set_ratio=0.7, seed=None, block_size=65536, buffer_size=1 << 20):
         # split samples into test, validation and training parts
         all_samples_num = self.total_num + 1
         train_samples_num = int(all_samples_num * train_set_ratio)
         test_samples_num = (all_samples_num - train_samples_num) // 2
-        processed = bitarray(all_samples_num)
-        processed.setall(False)
-        train_file = open(self.train_set_file, 'w')
-        train_index = 0
-        test_file = open(self.test_set_file, 'w')
-        test_index = 0
-        validation_file = open(self.validation_set_file, 'w')
-        validation_index = 0
+        # samples are shuffled with a random permutation and read in blocks sorted by keys
+        permutation = array('Q', range(all_samples_num))
+        random.Random(seed).shuffle(permutation)
+        train_file = open(self.train_set_file, 'wb', buffering=buffer_size)
+        test_file = open(self.test_set_file, 'wb', buffering=buffer_size)
+        validation_file = open(self.validation_set_file, 'wb', buffering=buffer_size)
+        parts = [(train_file, train_samples_num),
+                 (test_file, train_samples_num + test_samples_num),
+                 (validation_file, train_samples_num + 2 * test_samples_num)]
         try:
             with self.samples_db.begin(write=False) as txn:
-                for _ in tqdm(range(self.total_num + 1)):
-                    index = random.randint(0, self.total_num)
-                    while processed[index]:
-                        index = random.randint(0, self.total_num)
-                    processed[index] = True
-                    sample = txn.get(str(index).encode('ascii'))
-                    if train_index < train_samples_num:
-                        train_file.write(sample.decode('ascii'))
-                        train_index += 1
-                    elif test_index < test_samples_num:
-                        test_file.write(sample.decode('ascii'))
-                        test_index += 1
-                    elif validation_index < test_samples_num:
-                        validation_file.write(sample.decode('ascii'))
-                        validation_index += 1
+                with tqdm(total=all_samples_num) as pbar:
+                    for block_start in range(0, all_samples_num, block_size):
+                        block = permutation[block_start:block_start + block_size]
+                        samples = {index: txn.get(make_key(index), db=self.samples_table) for index in sorted(block)}
+                        for position, index in enumerate(block, block_start):
+                            for file, end_position in parts:
+                                if position < end_position:
+                                    file.write(samples[index])
+                                    break
+                        pbar.update(len(block))
         finally:
             print("Closing files ...")
             train_file.close()
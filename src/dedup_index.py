@@ -0,0 +1,62 @@
+import hashlib
+
+
+def mark_hash(src_mark):
+    return int.from_bytes(hashlib.blake2b(src_mark.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class DedupIndex:
+    # bloom filter of 64-bit source mark hashes limited by the given memory size, marks reported by the filter
+    # as possible duplicates are checked exactly with all seen marks stored in the LMDB table by their hashes
+    def __init__(self, db, memory_size=256 * 1024 * 1024, hashes_num=3):
+        self.db = db
+        self.bits_num = max(memory_size, 8) * 8
+        self.bits = bytearray(self.bits_num // 8)
+        self.hashes_num = hashes_num
+        self.marks_num = 0
+        self.duplicates = 0
+        # marks checked in the database because the filter reported them as possible duplicates
+        self.exact_checks = 0
+
+    def add(self, txn, src_mark, src_mark_hash=None):
+        if src_mark_hash is None:
+            src_mark_hash = mark_hash(src_mark)
+        key = src_mark_hash.to_bytes(8, 'big')
+        value = src_mark.encode('utf-8')
+        self.marks_num += 1
+        if self.__add_hash(src_mark_hash):
+            txn.put(key, value, db=self.db)
+            return True
+
+        self.exact_checks += 1
+        stored = txn.get(key, db=self.db)
+        if stored is None:
+            txn.put(key, value, db=self.db)
+            return True
+        # marks with the same hash are kept in the same record
+        marks = stored.split(b'\n')
+        if value in marks:
+            self.duplicates += 1
+            return False
+        txn.put(key, stored + b'\n' + value, db=self.db)
+        return True
+
+    def stats(self):
+        # exact checks of marks which weren't duplicates are false positives of the filter
+        return {'marks': self.marks_num, 'duplicates': self.duplicates, 'exact_checks': self.exact_checks,
+                'false_positives': self.exact_checks - self.duplicates}
+
+    def __add_hash(self, src_mark_hash):
+        # returns True if the hash wasn't in the filter
+        bits = self.bits
+        step = (src_mark_hash >> 32) | 1
+        position = src_mark_hash & 0xffffffff
+        added = False
+        for _ in range(self.hashes_num):
+            bit = position % self.bits_num
+            mask = 1 << (bit & 7)
+            if not bits[bit >> 3] & mask:
+                bits[bit >> 3] |= mask
+                added = True
+            position += step
+        return added
@@ -0,0 +1,41 @@
+import hashlib
+import lmdb
+import os
+
+
+class SharedFunctionIndex:
+    # source marks of already parsed header functions shared by all parser processes,
+    # the DB is opened lazily so every process gets its own environment handle after fork
+    def __init__(self, db_path, map_size=1 << 30):
+        self.db_path = db_path
+        self.map_size = map_size
+        self.db = None
+
+    def add(self, source_mark):
+        if self.db is None:
+            self.db = lmdb.open(self.db_path, map_size=self.map_size, subdir=False, sync=False, metasync=False)
+        key = self.__make_key(source_mark)
+        # check without the writer lock first, duplicates are the common case
+        with self.db.begin(write=False) as txn:
+            if txn.get(key) is not None:
+                return False
+        with self.db.begin(write=True) as txn:
+            return txn.put(key, b'', overwrite=False)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def remove(self):
+        self.close()
+        for file_path in [self.db_path, self.db_path + '-lock']:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    @staticmethod
+    def __make_key(source_mark):
+        key = '{0}:{1}'.format(source_mark[0], source_mark[1]).encode('utf-8')
+        if len(key) > 500:
+            key = hashlib.sha1(key).digest()  # LMDB keys are limited to 511 bytes
+        return key
@@ -0,0 +1,91 @@
+import json
+import os
+import shlex
+from pathlib import Path
+
+file_types = ('*.c', '*.cc', '*.cpp', '*.cxx', '*.c++')
+
+
+def files(input_path):
+    if os.path.isfile(input_path):
+        yield input_path
+    for file_type in file_types:
+        for file_path in Path(input_path).rglob(file_type):
+            yield file_path.as_posix()
+
+
+def is_object_file(file_path):
+    file_name = os.path.basename(file_path)
+    if '.o.' in file_name:
+        return True
+    elif '.o' in file_name[-2:]:
+        return True
+    else:
+        return False
+
+
+class JobPlanner:
+    # makes parsing jobs (file path, compilation arguments, working directory) for all translation units
+    # listed in the compile_commands.json file of the input directory, or for all source files found in it
+    # with default arguments if there is no compilation database
+    def __init__(self, input_path, default_compile_args=[]):
+        self.input_path = input_path
+        self.default_compile_args = default_compile_args
+        self.compdb_path = os.path.join(input_path, 'compile_commands.json')
+        self.paths_cache = {}
+        self.args_cache = {}
+
+    def has_compdb(self):
+        return os.path.isfile(self.compdb_path)
+
+    def jobs(self):
+        if not self.has_compdb():
+            # print('Compilation database was not found in the input directory, using default args list')
+            return [(file_path, self.default_compile_args, None) for file_path in files(self.input_path)]
+
+        with open(self.compdb_path, 'r') as file:
+            commands = json.load(file)
+        jobs = []
+        seen_files = set()
+        for command in commands:
+            directory = os.path.abspath(command['directory'])
+            file_path = os.path.normpath(os.path.join(directory, command['file']))
+            if file_path in seen_files:
+                continue  # only the first command of a file is used
+            seen_files.add(file_path)
+            if 'arguments' in command:
+                cmd_args = command['arguments']
+            else:
+                cmd_args = shlex.split(command['command'])
+            jobs.append((file_path, self.__clean_args(cmd_args, directory, file_path), directory))
+        return jobs
+
+    def __clean_args(self, cmd_args, directory, file_path):
+        # relative paths in arguments are resolved by libclang against the command directory,
+        # the option goes first so it can't become the value of another option
+        args = ['-working-directory=' + directory]
+        cmd_args = iter(cmd_args)
+        next(cmd_args)  # drop compiler executable path
+        for arg in cmd_args:
+            if arg == '-Xclang':
+                next(cmd_args)  # skip clang specific arguments
+            elif arg == '-c':
+                continue  # drop compilation only option
+            elif arg == '-o':
+                next(cmd_args, None)  # drop output filename option with its value
+            elif arg.startswith('-o') and is_object_file(arg):
+                continue  # drop joined output filename option
+            elif self.__is_input_file(arg, directory, file_path):
+                continue  # drop input filename
+            else:
+                args.append(arg)
+        # equal argument lists are shared by jobs
+        return self.args_cache.setdefault(tuple(args), args)
+
+    def __is_input_file(self, arg, directory, file_path):
+        key = (directory, arg)
+        value = self.paths_cache.get(key)
+        if value is None:
+            value = os.path.normpath(os.path.join(directory, arg))
+            self.paths_cache[key] = value
+        return value == file_path
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def file_hash(file_path):
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def shard_name(file_path, extension='.c2s'):
+    # deterministic name of the file holding samples of one translation unit
+    return hashlib.sha1(file_path.encode('utf-8')).hexdigest() + extension
+
+
+class FileHashes:
+    # content hashes of files, computed once per process because headers are shared by many translation units
+    def __init__(self):
+        self.hashes = {}
+
+    def get(self, file_path):
+        value = self.hashes.get(file_path)
+        if value is None:
+            try:
+                value = file_hash(file_path)
+            except OSError:
+                value = ''
+            self.hashes[file_path] = value
+        return value
+
+
+def manifest_shards(path):
+    # per translation unit samples files of all manifests in the path
+    shards = set()
+    for manifest_path in Path(path).rglob('manifest.json'):
+        manifest = Manifest(manifest_path.as_posix())
+        for entry in manifest.entries.values():
+            shards.add(os.path.join(os.path.dirname(manifest.path), entry['shard']))
+    return shards
+
+
+class Manifest:
+    # state of the previous mining run: for each translation unit the content hash, compilation arguments,
+    # hashes of all included headers and headers whose functions were written to its samples file
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                self.entries = json.load(file)
+
+    def is_up_to_date(self, file_path, args, hashes, extension='.c2s'):
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        if entry['shard'] != shard_name(file_path, extension):
+            return False  # the shard format was changed
+        if entry['args'] != list(args) or entry['hash'] != hashes.get(file_path):
+            return False
+        for header, header_hash in entry['includes'].items():
+            if hashes.get(header) != header_hash:
+                return False
+        return True
+
+    @staticmethod
+    def make_entry(file_path, args, includes, hashes, extension='.c2s', function_headers=()):
+        return {'hash': hashes.get(file_path),
+                'args': list(args),
+                'includes': {header: hashes.get(header) for header in includes},
+                'shard': shard_name(file_path, extension),
+                'function_headers': sorted(function_headers)}
+
+    def invalidate_dependents(self, jobs, hashes, extension='.c2s'):
+        # header functions are written only to samples of the first translation unit which parsed them,
+        # if this unit is removed or parsed again, units including these headers are parsed again too,
+        # so the functions don't disappear; returns the invalidated units
+        args = {job[0]: job[1] for job in jobs}
+        orphaned_headers = set()
+        for file_path, entry in self.entries.items():
+            if not entry.get('function_headers'):
+                continue
+            if file_path not in args or not self.is_up_to_date(file_path, args[file_path], hashes, extension):
+                orphaned_headers.update(entry['function_headers'])
+        if not orphaned_headers:
+            return []
+        dependents = [file_path for file_path, entry in self.entries.items()
+                      if file_path in args and not orphaned_headers.isdisjoint(entry['includes'])]
+        for file_path in dependents:
+            del self.entries[file_path]
+        return dependents
+
+    def update(self, file_path, entry):
+        previous_entry = self.entries.get(file_path)
+        if previous_entry is not None and previous_entry['shard'] != entry['shard']:
+            # samples of the previous run were written in another format
+            shard_file = os.path.join(os.path.dirname(self.path), previous_entry['shard'])
+            if os.path.exists(shard_file):
+                os.remove(shard_file)
+        self.entries[file_path] = entry
+
+    def remove_missing(self, file_paths, output_path):
+        # drop translation units which are not in the tree anymore together with their samples
+        for file_path in [f for f in self.entries if f not in file_paths]:
+            shard_file = os.path.join(output_path, self.entries[file_path]['shard'])
+            if os.path.exists(shard_file):
+                os.remove(shard_file)
+            del self.entries[file_path]
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.path)
@@ -27,6 +27,37 @@ def main():
                              default=100000000000,
                              required=False)
 
+    args_parser.add_argument('-s', '--seed',
+                             metavar='random_seed',
+                             type=int,
+                             help='seed of the samples shuffling, default(random)',
+                             default=None,
+                             required=False)
+
+    args_parser.add_argument('-j', '--jobs',
+                             metavar='processes_number',
+                             type=int,
+                             help='number of processes reading resource files, default(1)',
+                             default=1,
+                             required=False)
+
+    args_parser.add_argument('-d', '--dedup_memory',
+                             metavar='dedup_memory_size',
+                             type=int,
+                             help='memory size of the samples deduplication filter, default(268435456 bytes)',
+                             default=256 * 1024 * 1024,
+                             required=False)
+
+    args_parser.add_argument('-t', '--split_mode',
+                             metavar='split_mode',
+                             type=str,
+                             choices=['shuffle', 'sample', 'file'],
+                             help='shuffle - random split through the samples DB, '
+                                  'sample or file - single pass split by the hash of a sample source mark or '
+                                  'a source file name, default(shuffle)',
+                             default='shuffle',
+                             required=False)
+
     args = args_parser.parse_args()
 
     output_path = Path(args.DataPath).resolve().as_posix()
@@ -37,12 +68,25 @@ def main():
 
     print('Clear resources: ' + str(args.clear_resources))
 
-    # shuffle and merge samples
-    print("Merging samples ...")
-    merge = DataSetMerge(output_path, map_size)
-    merge.merge(args.clear_resources)
-    print("Dumping datasets ...")
-    merge.dump_datasets(0.7)
+    print('Seed: ' + str(args.seed))
+
+    print('Jobs: ' + str(args.jobs))
+
+    print('Deduplication memory size: ' + str(args.dedup_memory))
+
+    print('Split mode: ' + args.split_mode)
+
+    if args.split_mode == 'shuffle':
+        # shuffle and merge samples
+        print("Merging samples ...")
+        merge = DataSetMerge(output_path, map_size, args.dedup_memory)
+        merge.merge(args.clear_resources, args.jobs)
+        print("Dumping datasets ...")
+        merge.dump_datasets(0.7, args.seed)
+    else:
+        print("Splitting samples ...")
+        merge = DataSetMerge(output_path, map_size, args.dedup_memory)
+        merge.split(args.clear_resources, args.jobs, 0.7, args.split_mode)
     print("Merging done")
 
 
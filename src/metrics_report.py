@@ -0,0 +1,48 @@
+import heapq
+import json
+
+stages = ['parse_time', 'traversal_time', 'graph_time', 'paths_time', 'save_time']
+
+
+class MetricsReport:
+    # writes per-file metrics records to the JSONL file and keeps the slowest files and functions for the summary
+    def __init__(self, file_path, top_num=10):
+        self.file = open(file_path, 'w')
+        self.top_num = top_num
+        self.slowest_files = []
+        self.slowest_functions = []
+        self.totals = dict.fromkeys(stages + ['functions_num', 'contexts_num'], 0)
+        self.files_num = 0
+        self.max_rss = 0
+
+    def add(self, metrics):
+        self.file.write(json.dumps(metrics) + '\n')
+        self.files_num += 1
+        for name in self.totals:
+            self.totals[name] += metrics[name]
+        self.max_rss = max(self.max_rss, metrics['rss'])
+        self.__push(self.slowest_files, (metrics['total_time'], metrics['file']))
+        for function in metrics['slowest_functions']:
+            self.__push(self.slowest_functions,
+                        (function['time'], function['file'], function['line'], function['function']))
+
+    def close(self):
+        self.file.close()
+
+    def print_summary(self):
+        print('Files: {0} functions: {1} contexts: {2} max RSS: {3:.1f} MB'.format(
+            self.files_num, self.totals['functions_num'], self.totals['contexts_num'], self.max_rss / (1024 * 1024)))
+        print('Stages time: ' + ', '.join('{0} {1:.2f}s'.format(name[:-len('_time')], self.totals[name])
+                                          for name in stages))
+        print('Slowest files:')
+        for seconds, file_path in sorted(self.slowest_files, reverse=True):
+            print('  {0:.2f}s {1}'.format(seconds, file_path))
+        print('Slowest functions:')
+        for seconds, file_path, line, name in sorted(self.slowest_functions, reverse=True):
+            print('  {0:.2f}s {1} {2}:{3}'.format(seconds, name, file_path, line))
+
+    def __push(self, heap, item):
+        if len(heap) < self.top_num:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
@@ -1,21 +1,32 @@
 from clang.cindex import Config
 import argparse
-import time
 from pathlib import Path
 import multiprocessing
 import os
 from tqdm import tqdm
 from parser_process import ParserProcess
+from function_index import SharedFunctionIndex
+from manifest import Manifest, FileHashes
+from metrics_report import MetricsReport
+from supervisor import Supervisor, Quarantine
+from scheduler import load_costs, schedule
+from job_planner import JobPlanner
 
-file_types = ('*.c', '*.cc', '*.cpp', '*.cxx', '*.c++')
 
+def handle_result(record, manifest, metrics):
+    if record['entry'] is not None:
+        manifest.update(record['file'], record['entry'])
+    if 'metrics' in record:
+        metrics.add(record['metrics'])
 
-def files(input_path):
-    if os.path.isfile(input_path):
-        yield input_path
-    for file_type in file_types:
-        for file_path in Path(input_path).rglob(file_type):
-            yield file_path.as_posix()
+
+def collect_results(results, manifest, metrics):
+    if results is None:
+        return
+    while not results.empty():
+        record = results.get()
+        if record['event'] == 'done':
+            handle_result(record, manifest, metrics)
 
 
 def main():
@@ -60,6 +71,13 @@ def main():
                              default=0,
                              required=False)
 
+    args_parser.add_argument('--pairs_budget',
+                             metavar='pairs-number',
+                             type=int,
+                             help='maximum number of random terminal pairs tried per function',
+                             default=100000,
+                             required=False)
+
     args_parser.add_argument('-p', '--processes_num',
                              metavar='processes-number',
                              type=int,
@@ -67,6 +85,125 @@ def main():
                              default=4,
                              required=False)
 
+    args_parser.add_argument('-g', '--path_engine',
+                             metavar='path-engine',
+                             type=str,
+                             choices=['tree', 'networkx'],
+                             help='algorithm used to find paths between AST nodes (tree, networkx)',
+                             default='tree',
+                             required=False)
+
+    args_parser.add_argument('-m', '--mmap_sources',
+                             action='store_true',
+                             help='memory-map cached source files instead of reading them',
+                             required=False)
+
+    args_parser.add_argument('--pch_cache',
+                             metavar='pch-cache-path',
+                             type=str,
+                             help='reuse precompiled headers between files with the same compilation arguments, '
+                                  'PCH files are stored in the given directory',
+                             required=False)
+
+    args_parser.add_argument('--pch_cache_size',
+                             metavar='pch-cache-size',
+                             type=int,
+                             help='maximum size of the PCH cache directory, default(8589934592 bytes)',
+                             default=8 * 1024 * 1024 * 1024,
+                             required=False)
+
+    args_parser.add_argument('-f', '--shard_format',
+                             metavar='shard-format',
+                             type=str,
+                             choices=['text', 'binary'],
+                             help='format of raw samples files, text (.c2s) or binary (.c2b)',
+                             default='text',
+                             required=False)
+
+    args_parser.add_argument('-z', '--compression',
+                             metavar='compression',
+                             type=str,
+                             choices=['gzip', 'lzma'],
+                             help='compress raw samples files (gzip, lzma)',
+                             required=False)
+
+    args_parser.add_argument('--shard_size',
+                             metavar='megabytes',
+                             type=int,
+                             help='size of raw samples file after which the next file is started, default(256)',
+                             default=256,
+                             required=False)
+
+    args_parser.add_argument('--shard_samples',
+                             metavar='samples-number',
+                             type=int,
+                             help='number of samples in raw samples file after which the next file is started '
+                                  '(0 - no limit)',
+                             default=0,
+                             required=False)
+
+    args_parser.add_argument('-w', '--writer_queue',
+                             metavar='batches-number',
+                             type=int,
+                             help='write samples in a background thread of each process with the queue of '
+                                  'this size (0 - write in the parsing thread)',
+                             default=0,
+                             required=False)
+
+    args_parser.add_argument('-i', '--incremental',
+                             action='store_true',
+                             help='parse only files changed since the previous run into the same output path',
+                             required=False)
+
+    args_parser.add_argument('--metrics',
+                             metavar='metrics-path',
+                             type=str,
+                             help='write per-file parsing metrics to the given JSONL file',
+                             required=False)
+
+    args_parser.add_argument('--costs',
+                             metavar='metrics-path',
+                             type=str,
+                             help='metrics JSONL file of a previous run, files are scheduled by their parsing time '
+                                  'instead of their size',
+                             required=False)
+
+    args_parser.add_argument('-b', '--batch_size',
+                             metavar='files-number',
+                             type=int,
+                             help='maximum number of small files sent to a process as one task',
+                             default=16,
+                             required=False)
+
+    args_parser.add_argument('-t', '--timeout',
+                             metavar='seconds',
+                             type=int,
+                             help='maximum time of a file parsing, the process is terminated and the file is quarantined '
+                                  'if the time is exceeded (0 - no limit)',
+                             default=0,
+                             required=False)
+
+    args_parser.add_argument('--max_tasks',
+                             metavar='files-number',
+                             type=int,
+                             help='number of files after which a parser process is restarted (0 - no limit)',
+                             default=0,
+                             required=False)
+
+    args_parser.add_argument('--max_rss',
+                             metavar='megabytes',
+                             type=int,
+                             help='resident memory size after which a parser process is restarted (0 - no limit)',
+                             default=0,
+                             required=False)
+
+    args_parser.add_argument('-q', '--quarantine',
+                             metavar='quarantine-path',
+                             type=str,
+                             help='file with the list of files which hung or crashed parser processes, these files are '
+                                  'skipped, default(quarantine.txt in the output path)',
+                             required=False)
+
     args_parser.add_argument('-e', '--libclang',
                              metavar='libclang-path',
                              type=str,
@@ -94,49 +231,134 @@ def main():
     max_ast_depth = args.max_ast_depth
     print('Max AST depth: ' + str(max_ast_depth))
 
+    print('Pairs budget: ' + str(args.pairs_budget))
+
+    path_engine = args.path_engine
+    print('Path engine: ' + path_engine)
+
+    mmap_sources = args.mmap_sources
+    print('Memory-mapped sources: ' + str(mmap_sources))
+
+    pch_cache_path = Path(args.pch_cache).resolve().as_posix() if args.pch_cache else None
+    print('PCH cache path: ' + str(pch_cache_path))
+
+    print('Shard format: ' + args.shard_format)
+
+    print('Compression: ' + str(args.compression))
+
+    print('Shard size: ' + str(args.shard_size))
+
+    print('Shard samples: ' + str(args.shard_samples))
+
+    print('Writer queue: ' + str(args.writer_queue))
+
+    print('Incremental: ' + str(args.incremental))
+
+    metrics_path = Path(args.metrics).resolve().as_posix() if args.metrics else None
+    print('Metrics path: ' + str(metrics_path))
+
+    costs_path = Path(args.costs).resolve().as_posix() if args.costs else None
+    print('Costs path: ' + str(costs_path))
+
+    print('Batch size: ' + str(args.batch_size))
+
     input_path = Path(args.Path).resolve().as_posix()
     print('Input path: ' + input_path)
 
     output_path = Path(args.OutPath).resolve().as_posix()
     print('Output path: ' + output_path)
 
+    print('Timeout: ' + str(args.timeout))
+
+    print('Max tasks per process: ' + str(args.max_tasks))
+
+    print('Max RSS per process: ' + str(args.max_rss))
+
+    if args.quarantine:
+        quarantine_path = Path(args.quarantine).resolve().as_posix()
+    else:
+        quarantine_path = os.path.join(output_path, 'quarantine.txt')
+    print('Quarantine path: ' + quarantine_path)
+
     print("Parsing files ...")
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
     tasks = multiprocessing.JoinableQueue()
+    manifest = None
+    metrics = None
+    results = None
+    if args.incremental:
+        manifest = Manifest(os.path.join(output_path, 'manifest.json'))
+    # costs are loaded before the metrics file is opened because it can be the same file
+    costs = load_costs(costs_path) if costs_path else None
+    if metrics_path:
+        metrics = MetricsReport(metrics_path)
+    quarantine = Quarantine(quarantine_path)
+    # the compilation database is read once, processes get jobs with ready to use arguments
+    planner = JobPlanner(input_path)
+    print('Compilation database: ' + str(planner.has_compdb()))
+    all_jobs = planner.jobs()
+    all_files = set(job[0] for job in all_jobs)
+    jobs = [job for job in all_jobs if job[0] not in quarantine]
+    if manifest is not None:
+        extension = '.c2b' if args.shard_format == 'binary' else '.c2s'
+        dependents = manifest.invalidate_dependents(jobs, FileHashes(), extension)
+        print('Files parsed again for header functions: ' + str(len(dependents)))
+        # parser processes read the manifest when they are started
+        manifest.save()
     if parallel_processes_num == 1:
-        parser = ParserProcess(tasks, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, input_path,
-                               output_path)
-        for file_path in files(input_path):
-            print("Parsing : " + file_path)
-            tasks.put(file_path)
+        if manifest or metrics:
+            results = multiprocessing.SimpleQueue()
+        parser = ParserProcess(tasks, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, output_path,
+                               path_engine, mmap_sources, None, pch_cache_path, args.pch_cache_size,
+                               manifest.path if manifest else None, results, metrics is not None,
+                               shard_format=args.shard_format, pairs_budget=args.pairs_budget,
+                               compression=args.compression, shard_max_bytes=args.shard_size * 1024 * 1024,
+                               shard_max_samples=args.shard_samples, writer_queue_size=args.writer_queue)
+        for job in jobs:
+            print("Parsing : " + job[0])
+            tasks.put([job])
             parser.parse_file()
-        parser.save()
+            collect_results(results, manifest, metrics)
+        parser.close()
+        # records of the last files are reported when their samples are written
+        collect_results(results, manifest, metrics)
+        cache_stats = parser.parser.source_cache.stats()
+        print('Source cache hits: {0} misses: {1}'.format(cache_stats['hits'], cache_stats['misses']))
+        if parser.parser.pch_cache is not None:
+            pch_stats = parser.parser.pch_cache.stats()
+            print('PCH cache hits: {0} misses: {1}'.format(pch_stats['hits'], pch_stats['misses']))
         tasks.join()
     else:
-        processes = [ParserProcess(tasks, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, input_path,
-                                   output_path)
-                     for _ in range(parallel_processes_num)]
-        for p in processes:
-            p.start()
-
-        for file_path in files(input_path):
-            tasks.put(file_path)
-
-        # add terminating tasks
-        for i in range(parallel_processes_num):
-            tasks.put(None)
-
-        # Wait for all of the tasks to finish
-        tasks_left = tasks.qsize()
-        with tqdm(total=tasks_left) as pbar:
-            while tasks_left > 0:
-                time.sleep(1)
-                tasks_num = tasks.qsize()
-                pbar.update(tasks_left - tasks_num)
-                tasks_left = tasks_num
+        results = multiprocessing.SimpleQueue()
+        # header functions are deduplicated between processes with the shared index
+        functions_index = SharedFunctionIndex(os.path.join(output_path, 'functions.db'))
+        functions_index.remove()
 
-        tasks.join()
-        for p in processes:
-            p.join()
+        def make_process(worker_id):
+            return ParserProcess(tasks, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, output_path,
+                                 path_engine, mmap_sources, functions_index.db_path, pch_cache_path,
+                                 args.pch_cache_size, manifest.path if manifest else None, results,
+                                 metrics is not None, worker_id, args.max_tasks, args.max_rss * 1024 * 1024,
+                                 args.shard_format, args.pairs_budget, args.compression,
+                                 args.shard_size * 1024 * 1024, args.shard_samples, args.writer_queue, args.timeout)
+
+        # the largest files are parsed first so they don't finish last
+        for jobs_batch in schedule(jobs, parallel_processes_num, costs, args.batch_size):
+            tasks.put(jobs_batch)
+
+        supervisor = Supervisor(make_process, parallel_processes_num, tasks, results,
+                                lambda record: handle_result(record, manifest, metrics), quarantine)
+        with tqdm(total=len(jobs)) as pbar:
+            supervisor.run(len(jobs), pbar)
+        functions_index.remove()
+
+    if manifest is not None:
+        manifest.remove_missing(all_files, output_path)
+        manifest.save()
+    if metrics is not None:
+        metrics.close()
+        metrics.print_summary()
     print("Parsing done")
 
 
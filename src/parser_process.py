@@ -1,73 +1,153 @@
 import multiprocessing
 import os
-from clang.cindex import CompilationDatabase, CompilationDatabaseError
-from cpp_parser import AstParser
-
-
-def is_object_file(file_path):
-    file_name = os.path.basename(file_path)
-    if '.o.' in file_name:
-        return True
-    elif '.o' in file_name[-2:]:
-        return True
-    else:
-        return False
+import queue
+import signal
+from cpp_parser import AstParser, PchCache
+from cpp_parser.metrics import current_rss
+from function_index import SharedFunctionIndex
+from manifest import Manifest, FileHashes, shard_name
 
 
 class ParserProcess(multiprocessing.Process):
-    def __init__(self, task_queue, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, input_path, output_path):
+    def __init__(self, task_queue, max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, output_path,
+                 path_engine='tree', mmap_sources=False, functions_index_path=None, pch_cache_path=None,
+                 pch_cache_size=None, manifest_path=None, result_queue=None, collect_metrics=False, worker_id=0,
+                 max_tasks=0, max_rss=0, shard_format='text',
+                 pairs_budget=100000, compression=None, shard_max_bytes=256 * 1024 * 1024, shard_max_samples=0,
+                 writer_queue_size=0, timeout=0):
         multiprocessing.Process.__init__(self)
         self.task_queue = task_queue
-        self.parser = AstParser(max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, output_path)
-        try:
-            self.compdb = CompilationDatabase.fromDirectory(input_path)
-        except CompilationDatabaseError:
-            self.compdb = None
+        self.result_queue = result_queue
+        self.collect_metrics = collect_metrics
+        self.worker_id = worker_id
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.timeout = timeout
+        # done records of files whose samples aren't written to the file yet, they are reported after the flush,
+        # so files of a crashed process are parsed again by another one
+        self.unsaved_records = []
+        self.manifest = Manifest(manifest_path) if manifest_path else None
+        self.file_hashes = FileHashes()
+        self.parser = AstParser(max_contexts_num, max_path_len, max_subtokens_num, max_ast_depth, output_path,
+                                path_engine, mmap_sources, shard_format, pairs_budget, compression, shard_max_bytes,
+                                shard_max_samples, writer_queue_size)
+        if functions_index_path:
+            self.parser.shared_functions = SharedFunctionIndex(functions_index_path)
+        if pch_cache_path:
+            if pch_cache_size is None:
+                self.parser.pch_cache = PchCache(pch_cache_path)
+            else:
+                self.parser.pch_cache = PchCache(pch_cache_path, pch_cache_size)
 
     def run(self):
-        default_compile_args = []
-
-        while self.parse_file(default_compile_args):
-            pass
-
-        self.save()
+        tasks_num = 0
+        if self.timeout:
+            # the alarm terminates the process, libclang doesn't return to Python while it parses
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        try:
+            while True:
+                files_num = self.parse_file()
+                if not files_num:
+                    break
+                tasks_num += files_num
+                # the process is recycled by the supervisor to release memory held by libclang
+                if self.max_tasks and tasks_num >= self.max_tasks:
+                    break
+                if self.max_rss and current_rss() > self.max_rss:
+                    break
+        finally:
+            # samples are written and the raw samples file is completed even if parsing failed
+            self.close()
+        if self.parser.shared_functions is not None:
+            self.parser.shared_functions.close()
+        cache_stats = self.parser.source_cache.stats()
+        print('Source cache [{0}] hits: {1} misses: {2}'.format(os.getpid(), cache_stats['hits'], cache_stats['misses']))
+        if self.parser.pch_cache is not None:
+            pch_stats = self.parser.pch_cache.stats()
+            print('PCH cache [{0}] hits: {1} misses: {2}'.format(os.getpid(), pch_stats['hits'], pch_stats['misses']))
         return
 
     def save(self):
         self.parser.save()
 
-    def parse_file(self, default_compile_args=[]):
-        file_path = self.task_queue.get()
-        if file_path is None:
+    def close(self):
+        self.parser.close()
+        self.__report_records(self.unsaved_records)
+        self.unsaved_records = []
+
+    def parse_file(self):
+        # a task is a batch of jobs (file path, compilation arguments, working directory) made by the job planner,
+        # returns the number of parsed files or 0 for the terminating task
+        try:
+            jobs = self.task_queue.get(block=False)
+        except queue.Empty:
+            # samples of parsed files are written before waiting, so the supervisor knows they are done
+            self.__flush()
+            jobs = self.task_queue.get()
+        if jobs is None:
             self.task_queue.task_done()
-            return False
-        # print('Parsing : {0} [{1}]'.format(file_path, os.getpid()))
-        if not self.compdb:
-            # print('Compilation database was not found in the input directory, using default args list')
-            self.parser.parse([file_path] + default_compile_args)
-        else:
-            commands = self.compdb.getCompileCommands(file_path)
-            if commands and len(commands) > 0:
-                command = commands[0]
-                cwd = os.getcwd()
-                os.chdir(command.directory)
-                args = []
-                cmd_args = command.arguments
-                next(cmd_args)  # drop compiler executable path
-                for arg in cmd_args:
-                    if arg == '-Xclang':
-                        next(cmd_args)  # skip clang specific arguments
-                    elif arg == '-c':
-                        continue  # drop input filename option
-                    elif arg == '-o':
-                        continue  # drop output filename option
-                    elif os.path.isfile(arg) or os.path.isdir(arg):
-                        continue  # drop file names
-                    elif is_object_file(arg):
-                        continue  # drop file names
-                    else:
-                        args.append(arg)
-                self.parser.parse(args, command.filename)
-                os.chdir(cwd)
+            return 0
+        # the supervisor requeues not parsed files of the batch if the process is killed
+        self.__report({'event': 'batch', 'worker': self.worker_id, 'jobs': jobs})
+        for job in jobs:
+            self.__parse_file(*job)
         self.task_queue.task_done()
-        return True
+        return len(jobs)
+
+    def __parse_file(self, file_path, args, directory):
+        # print('Parsing : {0} [{1}]'.format(file_path, os.getpid()))
+        self.__report({'event': 'start', 'worker': self.worker_id, 'file': file_path})
+        record = {'event': 'done', 'worker': self.worker_id, 'file': file_path, 'entry': None}
+        # the alarm is set only while the file is parsed, so the process isn't terminated
+        # while it writes to the results queue or saves samples
+        if self.timeout:
+            signal.alarm(self.timeout)
+        try:
+            self.__parse(record, args, directory)
+        finally:
+            if self.timeout:
+                signal.alarm(0)
+        if self.manifest is not None:
+            # samples of the translation unit are already saved to its own file
+            self.__report(record)
+            return
+        # the file isn't quarantined if the process crashes before the samples are written
+        self.__report({'event': 'parsed', 'worker': self.worker_id, 'file': file_path})
+        self.unsaved_records.append(record)
+        if self.parser.unflushed_samples_num >= self.parser.save_buffer_size:
+            self.__flush(False)
+
+    def __flush(self, complete=True):
+        if not self.unsaved_records:
+            return
+        records = self.unsaved_records
+        self.unsaved_records = []
+        self.parser.flush(lambda: self.__report_records(records), complete)
+
+    def __parse(self, record, args, directory):
+        file_path = record['file']
+        # incremental mode, unchanged translation units keep their shards from the previous run
+        extension = self.parser.shard_extension
+        if self.manifest is not None and self.manifest.is_up_to_date(file_path, args, self.file_hashes, extension):
+            return
+        shard = shard_name(file_path, extension) if self.manifest is not None else None
+        ast = self.parser.parse(args, file_path, shard, directory)
+        if self.manifest is not None:
+            # relative include names are resolved against the working directory of the compilation command,
+            # headers of taken functions are resolved in the same way, so they can be found in includes
+            includes = [os.path.normpath(os.path.join(directory or os.getcwd(), include.include.name))
+                        for include in ast.get_includes()]
+            function_headers = [os.path.normpath(os.path.join(directory or os.getcwd(), header))
+                                for header in self.parser.function_headers]
+            record['entry'] = Manifest.make_entry(file_path, args, includes, self.file_hashes, extension,
+                                                  function_headers)
+        if self.collect_metrics:
+            record['metrics'] = self.parser.metrics.to_dict()
+
+    def __report_records(self, records):
+        for record in records:
+            self.__report(record)
+
+    def __report(self, record):
+        if self.result_queue is not None:
+            self.result_queue.put(record)
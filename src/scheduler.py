@@ -0,0 +1,60 @@
+import json
+import os
+
+
+def load_costs(metrics_path):
+    # parsing times of files from the metrics JSONL file of a previous run
+    costs = {}
+    with open(metrics_path, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # truncated last line of an interrupted run
+            costs[record['file']] = record['total_time']
+    return costs
+
+
+def file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def estimate_costs(file_paths, costs=None):
+    sizes = {file_path: file_size(file_path) for file_path in file_paths}
+    if not costs:
+        return sizes
+    # files missing in the previous run are estimated by their size and the average time per byte
+    known = [file_path for file_path in file_paths if file_path in costs]
+    known_size = sum(sizes[file_path] for file_path in known)
+    known_time = sum(costs[file_path] for file_path in known)
+    time_per_byte = known_time / known_size if known_size else 0.0
+    return {file_path: costs[file_path] if file_path in costs else sizes[file_path] * time_per_byte
+            for file_path in file_paths}
+
+
+def schedule(jobs, processes_num, costs=None, batch_size=16, tasks_per_process=16):
+    # returns the list of tasks ordered by decreasing cost, each task is a list of jobs;
+    # large files go alone so they start first, small files are batched to reduce queue round-trips
+    file_costs = estimate_costs([job[0] for job in jobs], costs)
+    ordered = sorted(jobs, key=lambda job: file_costs[job[0]], reverse=True)
+    batch_cost = sum(file_costs.values()) / max(processes_num * tasks_per_process, 1)
+
+    tasks = []
+    batch = []
+    cost = 0
+    for job in ordered:
+        if batch_size <= 1 or file_costs[job[0]] >= batch_cost:
+            tasks.append([job])
+            continue
+        batch.append(job)
+        cost += file_costs[job[0]]
+        if len(batch) >= batch_size or cost >= batch_cost:
+            tasks.append(batch)
+            batch = []
+            cost = 0
+    if batch:
+        tasks.append(batch)
+    return tasks
@@ -0,0 +1,124 @@
+import os
+import signal
+import time
+
+
+class Quarantine:
+    # files which hung or crashed parser processes, one path per line, they are skipped by next runs
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.files = set()
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r') as file:
+                self.files = set(line.rstrip('\n') for line in file if line.strip())
+
+    def __contains__(self, file_path):
+        return file_path in self.files
+
+    def add(self, file_path, reason):
+        print('Quarantined ({0}): {1}'.format(reason, file_path))
+        self.files.add(file_path)
+        with open(self.file_path, 'a') as file:
+            file.write(file_path + '\n')
+
+
+class Supervisor:
+    # runs parser processes and starts new processes instead of crashed, timed out or recycled ones;
+    # processes terminate themselves by the alarm if a file is parsed longer than the timeout.
+    # Files being parsed by terminated processes are quarantined, other files of their batches are queued again,
+    # a file is done only when its samples are written, so files with lost samples are queued again too
+    def __init__(self, make_process, processes_num, tasks, results, on_result, quarantine=None):
+        self.make_process = make_process
+        self.processes_num = processes_num
+        self.tasks = tasks
+        self.results = results
+        self.on_result = on_result
+        self.quarantine = quarantine
+        self.processes = {}
+        self.current_files = {}
+        self.pending_jobs = {}
+        self.next_worker_id = 0
+        self.done_num = 0
+
+    def run(self, tasks_num, pbar=None):
+        for _ in range(self.processes_num):
+            self.__start_process()
+
+        while self.done_num < tasks_num:
+            done_num = self.done_num
+            self.__handle_events(1.0)
+            self.__check_processes(True)
+            if pbar is not None:
+                pbar.update(self.done_num - done_num)
+
+        # add terminating tasks and wait for processes to save their samples
+        for _ in self.processes:
+            self.tasks.put(None)
+        while self.processes:
+            self.__handle_events(0.1)
+            self.__check_processes(False)
+
+    def __start_process(self):
+        worker_id = self.next_worker_id
+        self.next_worker_id += 1
+        process = self.make_process(worker_id)
+        process.start()
+        self.processes[worker_id] = process
+
+    def __handle_events(self, timeout):
+        # results is a SimpleQueue, its records are written synchronously so they aren't lost if a process dies
+        deadline = time.monotonic() + timeout
+        while True:
+            while not self.results.empty():
+                self.__handle_event(self.results.get())
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(0.01)
+
+    def __handle_event(self, record):
+        if record['event'] == 'batch':
+            # jobs of previous batches stay pending until their samples are written
+            self.pending_jobs.setdefault(record['worker'], []).extend(record['jobs'])
+        elif record['event'] == 'start':
+            self.current_files[record['worker']] = record['file']
+        elif record['event'] == 'parsed':
+            self.current_files.pop(record['worker'], None)
+        elif record['event'] == 'done':
+            # done records are sent after the samples are written, the process can parse the next file already
+            if self.current_files.get(record['worker']) == record['file']:
+                del self.current_files[record['worker']]
+            pending_jobs = self.pending_jobs.get(record['worker'])
+            if pending_jobs:
+                self.pending_jobs[record['worker']] = [job for job in pending_jobs if job[0] != record['file']]
+            self.done_num += 1
+            self.on_result(record)
+
+    def __check_processes(self, restart):
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            # events sent right before the exit can be still in the queue
+            self.__handle_events(0)
+            reason = 'timeout' if process.exitcode == -signal.SIGALRM else 'crash'
+            dropped_file = self.__drop_file(worker_id, reason)
+            del self.processes[worker_id]
+            self.__requeue_jobs(worker_id, dropped_file)
+            if restart:
+                self.__start_process()
+
+    def __drop_file(self, worker_id, reason):
+        current_file = self.current_files.pop(worker_id, None)
+        if current_file is None:
+            return None
+        if self.quarantine is not None:
+            self.quarantine.add(current_file, reason)
+        self.done_num += 1
+        return current_file
+
+    def __requeue_jobs(self, worker_id, dropped_file):
+        pending_jobs = self.pending_jobs.pop(worker_id, None)
+        if pending_jobs:
+            pending_jobs = [job for job in pending_jobs if job[0] != dropped_file]
+            if pending_jobs:
+                self.tasks.put(pending_jobs)